@@ -1,25 +1,193 @@
-import urllib.request
+#!/usr/bin/env python3
+"""
+按图片 ID 批量抓取 Civitai 元数据（prompt / 图片 URL / 模型）
+ID 来自命令行、文件或 stdin，在有界线程池中并发请求，结果完成一条写一条 JSONL。
+失败的 ID 写入 failed 文件（每行 `id<TAB>原因`），可直接作为下次的 --input 重试
+（--resume 时追加写入，以该文件为 --input 时重写）；
+存在但没有 prompt 的 ID 写入 no-prompt 文件（每行一个）；
+--resume 跳过输出文件和 no-prompt 文件中已有的 ID。
+
+使用方式:
+    python fetch_civitai.py 123,456,789
+    python fetch_civitai.py --input ids.txt --output meta.jsonl --resume
+    cut -f1 ids.tsv | python fetch_civitai.py --input - --workers 32 > meta.jsonl
+    python fetch_civitai.py --input scrapers/output/fetch_civitai_failed.txt --output meta.jsonl --resume
+"""
+
+import argparse
 import json
+import random
 import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+sys.path.insert(0, str(Path(__file__).parent / "scrapers"))
+from http_client import default_client
+
+API_URL = "https://civitai.com/api/v1/images/{}"
+DEFAULT_FAILED_FILE = "scrapers/output/fetch_civitai_failed.txt"
+DEFAULT_NO_PROMPT_FILE = "scrapers/output/fetch_civitai_no_prompt.txt"
+
+http = default_client()
+
+
+class NoPrompt(Exception):
+    """图片存在但没有 prompt 元数据"""
+
+
+def read_ids(sources: list[str], input_path: Optional[str]) -> Iterator[str]:
+    """命令行逗号分隔的 ID + 输入文件（'-' 为 stdin）每行第一列；忽略空行和 # 注释，保持顺序去重"""
+    seen = set()
+
+    def lines() -> Iterator[str]:
+        for arg in sources:
+            yield from arg.split(",")
+        if input_path == "-":
+            yield from sys.stdin
+        elif input_path:
+            with open(input_path, encoding="utf-8") as f:
+                yield from f
+
+    for line in lines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        img_id = line.replace(",", " ").split()[0]
+        if img_id not in seen:
+            seen.add(img_id)
+            yield img_id
+
+
+def done_ids(output_path: Optional[str], no_prompt_path: Optional[str] = None) -> set[str]:
+    """已写入输出文件的 ID，加上已确认没有 prompt 的 ID（--resume）"""
+    done = set()
+    if output_path and Path(output_path).exists():
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(str(json.loads(line)["id"]))
+                except (ValueError, KeyError, TypeError):
+                    continue  # 上次中断时写了一半的行
+    if no_prompt_path and Path(no_prompt_path).exists():
+        with open(no_prompt_path, encoding="utf-8") as f:
+            done.update(line.strip() for line in f if line.strip())
+    return done
 
-image_ids = sys.argv[1].split(',')
-results = []
 
-for img_id in image_ids[:50]:
+def fetch_one(img_id: str, timeout: float, retries: int) -> dict:
+    """
+    抓取单个 ID。429 / 5xx 的退避重试由 HttpClient 完成，重试耗尽的 HttpError 直接算失败；
+    这里只对 HttpClient 不重试的超时和连接错误再重试 retries 次。
+    """
+    for attempt in range(retries + 1):
+        try:
+            data = http.get_json(API_URL.format(img_id), timeout=timeout)
+            break
+        except (OSError, TimeoutError):
+            if attempt == retries:
+                raise
+        time.sleep(random.uniform(0, min(30.0, 2.0 ** attempt)))
+
+    meta = data.get("meta") or {}
+    if not meta.get("prompt"):
+        raise NoPrompt(img_id)
+    return {
+        "id": img_id,
+        "prompt": meta["prompt"],
+        "imageUrl": data.get("url", ""),
+        "tool": meta.get("Model", "Unknown"),
+        "nsfw": data.get("nsfw", False),
+    }
+
+
+def run(ids: list[str], out: TextIO, failed: TextIO, no_prompt: TextIO,
+        workers: int, timeout: float, retries: int) -> dict:
+    """有界并发：同时在途的任务不超过 workers * 2，完成一个写一个"""
+    stats = {"fetched": 0, "no_prompt": 0, "failed": 0}
+    pending: dict[Future, str] = {}
+
+    def drain(block_until_below: int) -> None:
+        while len(pending) > block_until_below:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                img_id = pending.pop(future)
+                try:
+                    record = future.result()
+                except NoPrompt:
+                    stats["no_prompt"] += 1
+                    no_prompt.write(f"{img_id}\n")
+                    no_prompt.flush()
+                    continue
+                except Exception as e:
+                    stats["failed"] += 1
+                    failed.write(f"{img_id}\t{e}\n")
+                    failed.flush()
+                    continue
+                stats["fetched"] += 1
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="civitai-fetch") as pool:
+        for img_id in ids:
+            pending[pool.submit(fetch_one, img_id, timeout, retries)] = img_id
+            drain(workers * 2 - 1)
+        drain(0)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按图片 ID 并发抓取 Civitai 元数据，输出 JSONL")
+    parser.add_argument("ids", nargs="*", help="逗号分隔的图片 ID")
+    parser.add_argument("--input", "-i", help="ID 文件，每行一个（取第一列）；'-' 表示 stdin")
+    parser.add_argument("--output", "-o", help="输出 JSONL 文件（默认 stdout）")
+    parser.add_argument("--failed", default=DEFAULT_FAILED_FILE, help="失败 ID 记录文件")
+    parser.add_argument("--no-prompt", default=DEFAULT_NO_PROMPT_FILE, help="没有 prompt 的 ID 记录文件")
+    parser.add_argument("--resume", action="store_true",
+                        help="跳过输出文件和 no-prompt 文件中已有的 ID，并追加写入")
+    parser.add_argument("--workers", type=int, default=16, help="并发请求数（默认 16）")
+    parser.add_argument("--rate", type=float, default=10.0, help="civitai.com 每秒请求数上限（默认 10，被限流时自动降速）")
+    parser.add_argument("--retries", type=int, default=3, help="单个 ID 超时 / 连接错误的重试次数（默认 3）")
+    parser.add_argument("--timeout", type=float, default=15.0, help="单次请求超时秒数（默认 15）")
+    args = parser.parse_args()
+
+    if not args.ids and not args.input:
+        parser.error("需要提供 ID 参数或 --input")
+
+    http.limiter.configure("civitai.com", args.rate, burst=max(1, args.workers))
+    skip = done_ids(args.output, args.no_prompt) if args.resume else set()
+    # 先读完输入：--input 可能就是本次要重写的 failed 文件
+    all_ids = list(read_ids(args.ids, args.input))
+    ids = [i for i in all_ids if i not in skip]
+
+    failed_path = Path(args.failed)
+    failed_path.parent.mkdir(parents=True, exist_ok=True)
+    # --resume 时保留以前的失败记录；以 failed 文件本身为输入时它已全部读入、本次重试，直接重写
+    retrying_failed = args.input not in (None, "-") and Path(args.input).resolve() == failed_path.resolve()
+    no_prompt_path = Path(args.no_prompt)
+    no_prompt_path.parent.mkdir(parents=True, exist_ok=True)
+    out = open(args.output, "a" if args.resume else "w", encoding="utf-8") if args.output else sys.stdout
+    t0 = time.monotonic()
     try:
-        url = f"https://civitai.com/api/v1/images/{img_id}"
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            data = json.loads(resp.read().decode())
-            if data.get('meta') and data['meta'].get('prompt'):
-                results.append({
-                    'id': img_id,
-                    'prompt': data['meta']['prompt'],
-                    'imageUrl': data.get('url', ''),
-                    'tool': data['meta'].get('Model', 'Unknown'),
-                    'nsfw': data.get('nsfw', False)
-                })
-    except:
-        pass
-
-print(json.dumps(results, ensure_ascii=False))
+        with open(failed_path, "a" if args.resume and not retrying_failed else "w", encoding="utf-8") as failed, \
+                open(no_prompt_path, "a" if args.resume else "w", encoding="utf-8") as no_prompt:
+            stats = run(ids, out, failed, no_prompt, args.workers, args.timeout, args.retries)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.monotonic() - t0
+    total = sum(stats.values())
+    print(
+        f"Fetched {stats['fetched']}, no prompt {stats['no_prompt']}, failed {stats['failed']} "
+        f"of {total} IDs in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} IDs/s)"
+        + (f", skipped {len(all_ids) - len(ids)} already done" if len(ids) < len(all_ids) else ""),
+        file=sys.stderr,
+    )
+    if stats["failed"]:
+        print(f"Failed IDs written to {failed_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,51 @@
 import json
-import hashlib
+import sys
 from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "scrapers"))
+from fingerprint import fingerprint
+from prompt_store import PromptStore
+from tagging import infer, stamp
 
 # 加载新数据
 with open('new_prompts.json', 'r', encoding='utf-8') as f:
     new_data = json.load(f)
 
 # 加载现有数据
-with open('data/prompts.json', 'r', encoding='utf-8') as f:
-    existing = json.load(f)
+store = PromptStore('data/prompts.json')
 
-# 去重
-existing_hashes = {hashlib.md5(p.get('prompt', '').encode()).hexdigest()[:12] for p in existing if p.get('prompt')}
-existing_urls = {img for p in existing for img in p.get('images', [])}
+# 去重（store sidecar 索引，按完整指纹 + 图片 URL）
+index = store.dedup
 
-added = 0
+new_records = []
 skipped = 0
 
 for item in new_data:
-    content_hash = hashlib.md5(item['prompt'].encode()).hexdigest()[:12]
+    fp = fingerprint(item['prompt'])
     
-    if content_hash in existing_hashes or item['imageUrl'] in existing_urls:
+    if index.find_fingerprint(fp) is not None or index.find_image(item['imageUrl']) is not None:
         skipped += 1
         continue
     
-    # 推断标签
-    tags = []
-    prompt_lower = item['prompt'].lower()
-    if any(w in prompt_lower for w in ['landscape', 'mountain', 'field', 'sky', 'nature']):
-        tags.append('landscape')
-    if any(w in prompt_lower for w in ['portrait', 'face', 'girl', 'woman', 'man']):
-        tags.append('portrait')
-    if any(w in prompt_lower for w in ['anime', 'manga']):
-        tags.append('anime')
-    if any(w in prompt_lower for w in ['fantasy', 'wizard', 'magic']):
-        tags.append('fantasy')
-    if any(w in prompt_lower for w in ['sci-fi', 'space', 'futuristic']):
-        tags.append('sci-fi')
-    if any(w in prompt_lower for w in ['cat', 'dog', 'animal', 'bird']):
-        tags.append('animal')
-    
-    if not tags:
-        tags = ['general']
+    # 推断标签 / 风格
+    tagging = infer(item['prompt'])
     
-    # 推断风格
-    style = 'realistic'
-    if 'anime' in prompt_lower or 'manga' in prompt_lower:
-        style = 'anime'
-    elif 'painting' in prompt_lower or 'oil painting' in prompt_lower:
-        style = 'painting'
-    elif 'cartoon' in prompt_lower or 'illustration' in prompt_lower:
-        style = 'illustration'
-    
-    existing.append({
-        "id": f"civitai_{content_hash}",
+    new_records.append({
+        "id": f"civitai_{fp.short}",
         "prompt": item['prompt'],
         "tool": item['model'],
-        "tags": tags,
-        "style": style,
+        "tags": tagging.tags,
+        "style": tagging.style,
         "images": [item['imageUrl']],
         "source_url": item['url'],
         "author": "Unknown",
         "created_at": datetime.utcnow().isoformat() + 'Z',
-        "collected_at": datetime.utcnow().isoformat() + 'Z'
+        "collected_at": datetime.utcnow().isoformat() + 'Z',
+        "tagging": stamp(item['prompt']),
     })
-    added += 1
-
-print(f"新增: {added}, 跳过: {skipped}, 总数: {len(existing)}")
 
-# 保存
-with open('data/prompts.json', 'w', encoding='utf-8') as f:
-    json.dump(existing, f, ensure_ascii=False, indent=2)
+# 保存：追加到 segment log，超过阈值时合并进 prompts.json
+store.append(new_records)
+store.maybe_compact()
+print(f"新增: {len(new_records)}, 跳过: {skipped}, 总数: {store.count}")
@@ -1,6 +1,11 @@
 import json
-import hashlib
+import sys
 from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "scrapers"))
+from fingerprint import fingerprint
+from prompt_store import PromptStore
 
 # 从 Playwriter 获取的数据
 new_prompts = [
@@ -13,19 +18,17 @@ new_prompts = [
 ]
 
 # 加载现有数据
-with open('data/prompts.json', 'r', encoding='utf-8') as f:
-    existing = json.load(f)
+store = PromptStore('data/prompts.json')
 
-# 去重
-existing_hashes = {hashlib.md5(p.get('prompt', '').encode()).hexdigest()[:12] for p in existing if p.get('prompt')}
-existing_urls = {img for p in existing for img in p.get('images', [])}
+# 去重（store sidecar 索引，按完整指纹 + 图片 URL）
+index = store.dedup
 
-added = 0
+new_records = []
 for item in new_prompts:
-    content_hash = hashlib.md5(item['prompt'].encode()).hexdigest()[:12]
-    if content_hash not in existing_hashes and item['imageUrl'] not in existing_urls:
-        existing.append({
-            "id": f"civitai_{content_hash}",
+    fp = fingerprint(item['prompt'])
+    if index.find_fingerprint(fp) is None and index.find_image(item['imageUrl']) is None:
+        new_records.append({
+            "id": f"civitai_{fp.short}",
             "prompt": item['prompt'],
             "tool": item['tool'],
             "tags": ["animal", "humor"],
@@ -34,8 +37,10 @@ for item in new_prompts:
             "source_url": "https://civitai.com/images/122270509",
             "author": "Lostcut",
             "created_at": datetime.utcnow().isoformat() + 'Z',
-            "collected_at": datetime.utcnow().isoformat() + 'Z'
+            "collected_at": datetime.utcnow().isoformat() + 'Z',
+            "tagging": {"manual": True},  # 手工打标，重打标时跳过
         })
-        added += 1
 
-print(f"新增: {added}, 总数: {len(existing)}")
+store.append(new_records)
+store.maybe_compact()
+print(f"新增: {len(new_records)}, 总数: {store.count}")
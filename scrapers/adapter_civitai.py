@@ -1,12 +1,18 @@
 """
 Civitai Adapter — 从 Civitai API 采集热门 AI 图片的 prompt
 Civitai 有公开 API，无需认证即可获取热门图片及其生成参数。
+iter_fetch 沿 metadata.nextCursor 懒加载翻页，调用方凑够 limit 条新条目停止迭代后即不再请求；
+传入 watermarks 时跳过已处理过的条目，遇到整页已处理过即停止翻页（见 watermarks.py）。
+水位线只记录调用方确认过（PromptItem.checkpoint）的条目，未入库的条目下次仍会抓取。
 """
 
-import json
-from urllib.request import urlopen, Request
+import functools
+import itertools
+from typing import Iterator, Optional
 from urllib.parse import urlencode
 from base_adapter import BaseAdapter, PromptItem, register_adapter
+from tagging import infer, stamp
+from watermarks import Watermark, follow_pages
 
 
 @register_adapter
@@ -17,100 +23,99 @@ class CivitaiAdapter(BaseAdapter):
 
     API_URL = "https://civitai.com/api/v1/images"
 
+    endpoints = ("images",)
+
+    PAGE_SIZE = 100
+    MAX_PAGES = 50  # 单次采集最多翻页数，防止全部已收录时无限翻页
+
     def fetch(self, limit: int = 50) -> list[PromptItem]:
-        params = {
-            "limit": min(limit, 100),
-            "sort": "Most Reactions",
-            "period": "Week",
-            "nsfw": "None",
-        }
-        url = f"{self.API_URL}?{urlencode(params)}"
-        req = Request(url, headers={"User-Agent": "PromptVault/1.0"})
-
-        try:
-            with urlopen(req, timeout=30) as resp:
-                data = json.loads(resp.read())
-        except Exception as e:
-            print(f"[Civitai] API error: {e}")
-            return []
-
-        items = []
-        for img in data.get("items", []):
-            meta = img.get("meta") or {}
-            prompt_text = meta.get("prompt", "").strip()
-            if not prompt_text or len(prompt_text) < 20:
-                continue
-
-            negative = meta.get("negativePrompt", "")
-            if negative:
-                prompt_text += f"\n\nNegative prompt: {negative}"
-
-            # 从 meta 提取工具信息
-            model = meta.get("Model", "")
-            tool = "Stable Diffusion"
-            if "flux" in model.lower():
-                tool = "Flux"
-            elif "sdxl" in model.lower():
-                tool = "SDXL"
-            elif "midjourney" in model.lower():
-                tool = "Midjourney"
-
-            # 从 prompt 内容推断 tags
-            tags = self._infer_tags(prompt_text)
-
-            # 从 prompt 内容推断 style
-            style = self._infer_style(prompt_text)
-
-            items.append(PromptItem(
-                prompt=prompt_text,
-                images=[img.get("url", "")],
-                tags=tags,
-                style=style,
-                source_url=f"{self.base_url}/images/{img.get('id', '')}",
-                author=img.get("username", ""),
-                tool=tool,
-                created_at=img.get("createdAt", "")[:10],
-                source_name=self.name,
-            ))
-
-        return items[:limit]
-
-    def _infer_tags(self, prompt: str) -> list[str]:
-        """基于 prompt 关键词推断 tags"""
-        prompt_lower = prompt.lower()
-        tag_keywords = {
-            "portrait": ["portrait", "face", "headshot", "woman", "man", "girl", "boy"],
-            "landscape": ["landscape", "scenery", "mountain", "ocean", "forest", "nature"],
-            "anime": ["anime", "manga", "waifu", "chibi"],
-            "photorealistic": ["photorealistic", "photo", "realistic", "raw photo", "dslr"],
-            "fantasy": ["fantasy", "dragon", "magic", "wizard", "elf", "sword"],
-            "sci-fi": ["sci-fi", "cyberpunk", "futuristic", "robot", "mech", "space"],
-            "architecture": ["architecture", "building", "interior", "room", "house"],
-            "product": ["product", "commercial", "advertisement", "packaging"],
-            "character": ["character", "oc", "costume", "armor"],
-            "cinematic": ["cinematic", "film", "movie", "dramatic lighting"],
-        }
-        tags = []
-        for tag, keywords in tag_keywords.items():
-            if any(kw in prompt_lower for kw in keywords):
-                tags.append(tag)
-        return tags or ["general"]
-
-    def _infer_style(self, prompt: str) -> str:
-        """基于 prompt 推断风格"""
-        prompt_lower = prompt.lower()
-        style_map = [
-            ("anime", ["anime", "manga", "waifu"]),
-            ("photorealistic", ["photorealistic", "raw photo", "dslr", "realistic"]),
-            ("digital-art", ["digital art", "digital painting", "illustration"]),
-            ("oil-painting", ["oil painting", "classical", "renaissance"]),
-            ("pixel-art", ["pixel art", "8-bit", "16-bit"]),
-            ("3d-render", ["3d render", "blender", "octane", "unreal engine"]),
-            ("cinematic", ["cinematic", "film still", "movie"]),
-            ("watercolor", ["watercolor", "aquarelle"]),
-            ("concept-art", ["concept art", "environment design"]),
-        ]
-        for style, keywords in style_map:
-            if any(kw in prompt_lower for kw in keywords):
-                return style
-        return "mixed"
+        return list(itertools.islice(self.iter_fetch(limit), limit))
+
+    def iter_pages(
+        self,
+        sort: str = "Most Reactions",
+        period: str = "Week",
+        mark: Optional[Watermark] = None,
+        max_pages: Optional[int] = None,
+        observe: bool = True,
+    ) -> Iterator[list[dict]]:
+        """沿 metadata.nextCursor 逐页拉取原始图片数据，没有下一页、出错或整页已见过时结束"""
+        if not self.endpoint_allowed("images"):
+            return
+
+        def fetch_page(cursor: Optional[str]):
+            params = {
+                "limit": self.PAGE_SIZE,
+                "sort": sort,
+                "period": period,
+                "nsfw": "None",
+            }
+            if cursor:
+                params["cursor"] = cursor
+            url = f"{self.API_URL}?{urlencode(params)}"
+
+            try:
+                resp = self.http.get(url, timeout=self.timeout, cache_ttl=self.cache_ttl)
+                data = resp.json()
+            except Exception as e:
+                print(f"[Civitai] API error: {e}")
+                self.record_endpoint("images", e)
+                return None
+            self.record_endpoint("images")
+            next_cursor = (data.get("metadata") or {}).get("nextCursor")
+            return data.get("items", []), next_cursor
+
+        yield from follow_pages(fetch_page, mark, max_pages or self.MAX_PAGES, observe=observe)
+
+    def watermark(self, sort: str = "Most Reactions", period: str = "Week") -> Optional[Watermark]:
+        if self.watermarks is None:
+            return None
+        return self.watermarks.get(self.name, f"{sort}/{period}", ordered_by_id=sort == "Newest")
+
+    def iter_fetch(self, limit: int = 50) -> Iterator[PromptItem]:
+        """
+        逐页产出 PromptItem，不按原始条数截断：limit 指的是去重后的新条目数，
+        由调用方（fetch_new / Pipeline）凑够后停止迭代，停止后不再请求下一页。
+        有水位线时跳过已处理过的条目；产出的条目需调用方在入库（或确定丢弃）后调用 checkpoint
+        """
+        mark = self.watermark()
+        for page in self.iter_pages(mark=mark, observe=False):
+            for img in page:
+                if mark is not None and mark.is_known(img):
+                    continue
+                item = self._to_item(img)
+                position = {"id": img.get("id"), "createdAt": img.get("createdAt")}
+                if item is None:
+                    # 没有可用 prompt 的条目不会进入下游，直接记为已处理
+                    if mark is not None:
+                        mark.observe([position])
+                    continue
+                if mark is not None:
+                    item.checkpoint = functools.partial(mark.observe, [position])
+                yield item
+
+    def _to_item(self, img: dict) -> Optional[PromptItem]:
+        meta = img.get("meta") or {}
+        prompt_text = meta.get("prompt", "").strip()
+        if not prompt_text or len(prompt_text) < 20:
+            return None
+
+        negative = meta.get("negativePrompt", "")
+        if negative:
+            prompt_text += f"\n\nNegative prompt: {negative}"
+
+        # 从 meta 的模型名和 prompt 内容推断 tags / style / tool
+        tags, style, tool = infer(prompt_text, model=meta.get("Model", ""))
+
+        return PromptItem(
+            prompt=prompt_text,
+            images=[img.get("url", "")],
+            tags=tags,
+            style=style,
+            source_url=f"{self.base_url}/images/{img.get('id', '')}",
+            author=img.get("username", ""),
+            tool=tool,
+            created_at=img.get("createdAt", "")[:10],
+            source_name=self.name,
+            tagging=stamp(prompt_text),
+        )
@@ -2,14 +2,16 @@
 PromptHero Adapter — 从 PromptHero 网站采集热门 prompt
 
 NOTE (2026-03-02): PromptHero 已迁移至 Next.js SPA，服务端返回空壳 HTML，
-静态抓取无法获取 prompt 数据。此 adapter 已标记为 broken。
+静态抓取无法获取 prompt 数据。此 adapter 已标记为 broken（known_broken），
+熔断器只会偶尔探测一次，不再在每次 `--source all` 中超时。
 建议使用 Civitai adapter (batch_collect.py) 作为替代数据源。
 """
 
 import json
 import re
-from urllib.request import urlopen, Request
 from base_adapter import BaseAdapter, PromptItem, register_adapter
+from source_health import SourceUnavailable
+from tagging import infer, stamp
 
 
 @register_adapter
@@ -18,32 +20,45 @@ class PromptHeroAdapter(BaseAdapter):
     display_name = "PromptHero"
     base_url = "https://prompthero.com"
 
+    endpoints = ("prompts",)
+    known_broken = {"prompts": "2026-03-02"}
+
     def fetch(self, limit: int = 50) -> list[PromptItem]:
         """抓取 PromptHero 热门 prompt 页面"""
+        return self.call_endpoint("prompts", lambda: self._fetch_pages(limit))
+
+    def _fetch_pages(self, limit: int) -> list[PromptItem]:
         items = []
+        parsed_pages = 0
         pages_needed = (limit // 20) + 1
 
         for page in range(1, pages_needed + 1):
             url = f"{self.base_url}/prompts?page={page}&sort=popular&time=week"
-            req = Request(url, headers={
+            headers = {
                 "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
                               "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
                 "Accept": "text/html,application/xhtml+xml",
-            })
+            }
 
             try:
-                with urlopen(req, timeout=30) as resp:
-                    html = resp.read().decode("utf-8", errors="ignore")
+                resp = self.http.get(url, headers=headers, timeout=self.timeout, cache_ttl=self.cache_ttl)
             except Exception as e:
+                if not items:
+                    raise  # 第一页就失败时不再逐页等待超时
                 print(f"[PromptHero] Page {page} error: {e}")
-                continue
+                break
+            # 304 / 内容未变时 resp 是本地副本，照常解析，是否已收录交给去重判断
+            html = resp.text()
 
             page_items = self._parse_html(html)
+            parsed_pages += 1
             items.extend(page_items)
 
             if len(items) >= limit:
                 break
 
+        if parsed_pages and not items:
+            raise SourceUnavailable("no prompts parsed (SPA shell HTML)")
         return items[:limit]
 
     def _parse_html(self, html: str) -> list[PromptItem]:
@@ -82,15 +97,17 @@ class PromptHeroAdapter(BaseAdapter):
         if not prompt_text or len(prompt_text) < 20:
             return None
         image_url = data.get("contentUrl", "") or data.get("image", "")
+        tagging = infer(prompt_text)
         return PromptItem(
             prompt=prompt_text,
             images=[image_url] if image_url else [],
-            tags=self._extract_tags(prompt_text),
-            style=self._guess_style(prompt_text),
+            tags=tagging.tags,
+            style=tagging.style,
             source_url=data.get("url", ""),
             author=data.get("author", {}).get("name", "") if isinstance(data.get("author"), dict) else "",
-            tool=self._guess_tool(prompt_text),
+            tool=tagging.tool,
             source_name=self.name,
+            tagging=stamp(prompt_text),
         )
 
     def _parse_cards(self, html: str) -> list[PromptItem]:
@@ -108,45 +125,15 @@ class PromptHeroAdapter(BaseAdapter):
             if len(prompt_text) < 20:
                 continue
             img = images[i] if i < len(images) else ""
+            tagging = infer(prompt_text)
             items.append(PromptItem(
                 prompt=prompt_text,
                 images=[img] if img else [],
-                tags=self._extract_tags(prompt_text),
-                style=self._guess_style(prompt_text),
+                tags=tagging.tags,
+                style=tagging.style,
                 source_url=self.base_url,
-                tool=self._guess_tool(prompt_text),
+                tool=tagging.tool,
                 source_name=self.name,
+                tagging=stamp(prompt_text),
             ))
         return items
-
-    def _extract_tags(self, prompt: str) -> list[str]:
-        prompt_lower = prompt.lower()
-        tags = []
-        tag_map = {
-            "portrait": "portrait", "landscape": "landscape", "anime": "anime",
-            "fantasy": "fantasy", "sci-fi": "sci-fi", "cyberpunk": "cyberpunk",
-            "realistic": "photorealistic", "architecture": "architecture",
-            "character": "character", "product": "product",
-        }
-        for keyword, tag in tag_map.items():
-            if keyword in prompt_lower:
-                tags.append(tag)
-        return tags or ["general"]
-
-    def _guess_style(self, prompt: str) -> str:
-        prompt_lower = prompt.lower()
-        if "anime" in prompt_lower:
-            return "anime"
-        if "realistic" in prompt_lower or "photo" in prompt_lower:
-            return "photorealistic"
-        if "painting" in prompt_lower:
-            return "digital-art"
-        return "mixed"
-
-    def _guess_tool(self, prompt: str) -> str:
-        prompt_lower = prompt.lower()
-        if "midjourney" in prompt_lower or "--ar" in prompt_lower:
-            return "Midjourney"
-        if "flux" in prompt_lower:
-            return "Flux"
-        return "Stable Diffusion"
@@ -0,0 +1,75 @@
+"""
+PromptVault Audit Cache — 合规审查结果缓存
+按条目内容 hash 保存 FilterResult，并记录生成这些结果的规则集指纹
+（关键词列表 + URL 模式）。再次审查时只检查新增或内容变化的条目；
+规则集变化时缓存整体失效，全部重新检查。
+
+使用方式:
+    from audit_cache import AuditCache
+    cache = AuditCache()
+    safe, review, blocked = ContentFilter().filter_items(items, cache=cache)
+    cache.save()
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from content_filter import FilterResult, ruleset_fingerprint
+
+
+def item_audit_key(item: dict) -> str:
+    """审查结果只取决于 prompt 原文和图片 URL"""
+    payload = item.get("prompt", "") + "\0" + "\n".join(item.get("images", []))
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+class AuditCache:
+    """content hash → 审查结果，规则集变化时自动失效"""
+
+    def __init__(self, path: str | Path = "scrapers/output/audit_cache.json", image_backend: str = ""):
+        self.path = Path(path)
+        self.ruleset = ruleset_fingerprint(image_backend)
+        self.results: dict[str, list] = {}
+        self._touched: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text())
+            except json.JSONDecodeError:
+                data = {}
+            if data.get("ruleset") == self.ruleset:
+                self.results = data.get("results", {})
+
+    def __contains__(self, item: dict) -> bool:
+        return item_audit_key(item) in self.results
+
+    def get(self, item: dict) -> Optional[FilterResult]:
+        key = item_audit_key(item)
+        cached = self.results.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched.add(key)
+        blocked, needs_review, reasons = cached
+        result = FilterResult(item_id=item.get("id", "unknown"), prompt_preview=item.get("prompt", ""))
+        result.blocked, result.needs_review, result.reasons = blocked, needs_review, list(reasons)
+        return result
+
+    def put(self, item: dict, result: FilterResult) -> None:
+        key = item_audit_key(item)
+        self.results[key] = [result.blocked, result.needs_review, result.reasons]
+        self._touched.add(key)
+
+    def save(self, prune: bool = False) -> None:
+        """写回缓存；prune=True 时丢弃本次未出现的条目（全量审查后使用）"""
+        if prune:
+            self.results = {k: v for k, v in self.results.items() if k in self._touched}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"ruleset": self.ruleset, "results": self.results}, ensure_ascii=False))
+        os.replace(tmp, self.path)
@@ -4,11 +4,18 @@ PromptVault Source Adapter Framework
 """
 
 import json
-import hashlib
 from abc import ABC, abstractmethod
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
+
+from dedup_index import DedupIndex
+from fingerprint import Fingerprint, fingerprint
+from http_client import HttpClient, default_client
+from near_dup import NearDupIndex
+from rate_limit import HostLimit
+from source_health import SourceHealth
+from watermarks import WatermarkStore
 
 
 class PromptItem:
@@ -25,6 +32,7 @@ class PromptItem:
         tool: str = "Unknown",
         created_at: str = "",
         source_name: str = "",
+        tagging: Optional[dict] = None,
     ):
         self.prompt = prompt.strip()
         self.images = images
@@ -36,12 +44,19 @@ class PromptItem:
         self.created_at = created_at or datetime.now().strftime("%Y-%m-%d")
         self.collected_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
         self.source_name = source_name
+        self.tagging = tagging  # tags / style 的来源（tagging.stamp() 或 {"manual": True}）
+        # 条目入库或被确定丢弃后由调用方调用，推进数据源的增量水位线；None 表示无需确认
+        self.checkpoint: Optional[Callable[[], None]] = None
+
+    @property
+    def fingerprint(self) -> Fingerprint:
+        """去重指纹（完整 128-bit digest + 规范化长度）"""
+        return fingerprint(self.prompt)
 
     @property
     def content_hash(self) -> str:
-        """基于 prompt 文本生成去重 hash"""
-        normalized = " ".join(self.prompt.lower().split())
-        return hashlib.md5(normalized.encode()).hexdigest()[:12]
+        """基于 prompt 文本生成去重 hash（指纹的 12 位短形式）"""
+        return self.fingerprint.short
 
     def generate_id(self, index: int) -> str:
         """生成唯一 ID: 日期_源名_序号"""
@@ -50,7 +65,7 @@ class PromptItem:
         return f"{date_str}_{src}_{index:03d}"
 
     def to_dict(self, id_str: str = "") -> dict:
-        return {
+        record = {
             "id": id_str,
             "prompt": self.prompt,
             "images": self.images,
@@ -62,6 +77,9 @@ class PromptItem:
             "created_at": self.created_at,
             "collected_at": self.collected_at,
         }
+        if self.tagging is not None:
+            record["tagging"] = self.tagging
+        return record
 
 
 class BaseAdapter(ABC):
@@ -73,10 +91,66 @@ class BaseAdapter(ABC):
     name: str = "base"          # 数据源标识
     display_name: str = "Base"  # 显示名称
     base_url: str = ""          # 数据源网站
+    timeout: float = 30         # 单次 HTTP 请求超时（秒）
+    cache_ttl: Optional[float] = 0  # 页面条件请求缓存的 ttl（秒），0 = 每次用 ETag 重新验证，None = 不缓存
+    rate_limits: dict[str, HostLimit] = {}  # 覆盖 rate_limit.HOST_LIMITS 中本数据源 host 的限速
+    endpoints: tuple[str, ...] = ()         # 受熔断器保护的 endpoint 名称
+    known_broken: dict[str, str] = {}       # endpoint → 已知失效日期，无历史记录时直接按熔断处理
 
-    def __init__(self, output_dir: str = "scrapers/output"):
+    def __init__(
+        self,
+        output_dir: str = "scrapers/output",
+        watermarks: Optional[WatermarkStore] = None,
+        health: Optional[SourceHealth] = None,
+    ):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.watermarks = watermarks  # 增量抓取水位线，None 时每次从 feed 顶部抓取
+        self.health = health          # endpoint 健康状态 / 熔断器，None 时不做判断
+        if self.http.limiter is not None:
+            for host, limit in self.rate_limits.items():
+                self.http.limiter.configure(host, limit.rate, limit.burst)
+
+    @property
+    def http(self) -> HttpClient:
+        """共享的连接池 HTTP 客户端（所有 adapter 复用同一组 keep-alive 连接）"""
+        return default_client()
+
+    # ---------- endpoint 熔断 ----------
+
+    def endpoint_key(self, endpoint: str) -> str:
+        return f"{self.name}:{endpoint}"
+
+    def endpoint_allowed(self, endpoint: str) -> bool:
+        """熔断中的 endpoint 直接跳过（冷却期结束后放行一次探测）"""
+        if self.health is None:
+            return True
+        key = self.endpoint_key(endpoint)
+        if self.health.allow(key, self.known_broken.get(endpoint)):
+            return True
+        print(f"[{self.display_name}] Skipping {endpoint}: {self.health.describe(key)}")
+        return False
+
+    def record_endpoint(self, endpoint: str, error: Optional[object] = None) -> None:
+        if self.health is None:
+            return
+        if error is None:
+            self.health.record_success(self.endpoint_key(endpoint))
+        else:
+            self.health.record_failure(self.endpoint_key(endpoint), error)
+
+    def call_endpoint(self, endpoint: str, fn: Callable[[], list[PromptItem]]) -> list[PromptItem]:
+        """在熔断器保护下调用 fn；异常（含 SourceUnavailable）计为失败并返回空列表"""
+        if not self.endpoint_allowed(endpoint):
+            return []
+        try:
+            items = fn()
+        except Exception as e:
+            print(f"[{self.display_name}] {endpoint} error: {e}")
+            self.record_endpoint(endpoint, e)
+            return []
+        self.record_endpoint(endpoint)
+        return items
 
     @abstractmethod
     def fetch(self, limit: int = 50) -> list[PromptItem]:
@@ -89,8 +163,54 @@ class BaseAdapter(ABC):
         """
         ...
 
-    def save(self, items: list[PromptItem]) -> Path:
-        """将采集结果保存为统一 JSON 格式"""
+    def iter_fetch(self, limit: int = 50) -> Iterator[PromptItem]:
+        """
+        逐条产出 PromptItem。默认包装 fetch()；支持分页的数据源应覆盖为生成器，
+        按页懒加载，调用方停止迭代时不再请求后续页面。
+        """
+        yield from self.fetch(limit=limit)
+
+    def fetch_new(
+        self,
+        limit: int = 50,
+        near_dup: Optional[NearDupIndex] = None,
+        dedup: Optional[DedupIndex] = None,
+    ) -> list[PromptItem]:
+        """
+        从 iter_fetch() 拉取，跳过批次内重复、已收录（dedup）和与语料近似重复（near_dup）
+        的条目，得到 limit 条新条目后立即停止。
+        """
+        items = []
+        seen: set[Fingerprint] = set()
+        fetched = 0
+        for item in self.iter_fetch(limit=limit):
+            fetched += 1
+            fp = item.fingerprint
+            if fp in seen:
+                continue
+            if dedup is not None and dedup.contains(item):
+                continue
+            if near_dup is not None and near_dup.query(item) is not None:
+                continue
+            seen.add(fp)
+            items.append(item)
+            if len(items) >= limit:
+                break
+        if fetched > len(items):
+            print(f"[{self.display_name}] Skipped {fetched - len(items)} already known prompts")
+        return items
+
+    def save(self, items: list[PromptItem], near_dup: Optional[NearDupIndex] = None) -> Path:
+        """
+        将采集结果保存为统一 JSON 格式。
+        传入 near_dup 索引时，先去掉与已收录语料或本批次内其他条目近似重复的 prompt。
+        """
+        if near_dup is not None:
+            unique = near_dup.filter_new(items)
+            if len(unique) < len(items):
+                print(f"[{self.display_name}] Dropped {len(items) - len(unique)} near-duplicates")
+            items = unique
+
         date_str = datetime.now().strftime("%Y%m%d_%H%M")
         output_file = self.output_dir / f"{self.name}_{date_str}.json"
 
@@ -103,12 +223,17 @@ class BaseAdapter(ABC):
         output_file.write_text(json.dumps(records, ensure_ascii=False, indent=2))
         return output_file
 
-    def run(self, limit: int = 50) -> Path:
+    def run(
+        self,
+        limit: int = 50,
+        near_dup: Optional[NearDupIndex] = None,
+        dedup: Optional[DedupIndex] = None,
+    ) -> Path:
         """采集并保存，返回输出文件路径"""
         print(f"[{self.display_name}] Fetching up to {limit} prompts...")
-        items = self.fetch(limit=limit)
+        items = self.fetch_new(limit=limit, near_dup=near_dup, dedup=dedup)
         print(f"[{self.display_name}] Got {len(items)} prompts")
-        output = self.save(items)
+        output = self.save(items, near_dup=near_dup)
         print(f"[{self.display_name}] Saved to {output}")
         return output
 
@@ -0,0 +1,316 @@
+"""
+PromptVault Browser Client — 常驻浏览器 worker 的 Python 端
+第一次提交任务时启动 `node browser_worker.js`（headless Chromium，整个进程只启动一次），
+之后通过 stdin / stdout 逐行 JSON 提交抓取任务：重复抓取只需一次页面导航，
+不再每次 npx 解析包、启动 Node、连接并关闭浏览器。
+
+- 任务按 id 与结果对应，submit() 返回 Future；worker 在同一浏览器连接上
+  每个任务开一个标签页（最多 max_tabs 个）并行执行，scrape_all() 一次提交多个数据源 / feed，
+  总耗时接近最慢的那个页面
+- 按资源类型（字体、视频等）和 host 后缀（统计 / 广告脚本）拦截请求，
+  worker 级默认值可按任务覆盖
+- worker 异常退出时，未完成的任务以 BrowserError 结束，下次提交时自动重启
+- capture 模式（capture_job）不读 DOM：拦截页面自己的 JSON XHR / fetch 响应（及 __NEXT_DATA__），
+  直接取出带 prompt 字段的对象；每解析到新数据就继续滚动，够 limit 条或连续两次滚动没有新数据即停止
+- 设置 PV_BROWSER_CDP（如 http://localhost:9222）时连接已打开的浏览器而不是启动 headless
+- 进程退出时自动关闭浏览器
+
+依赖: node + playwright（npm install -g playwright && npx playwright install chromium）
+
+使用方式:
+    worker = default_worker()
+    items = worker.scrape("https://civitai.com/images", selector="article",
+                          extract="el => ({image: el.querySelector('img')?.src || ''})", limit=30)
+    results = worker.scrape_all([scrape_job(url_a, ...), capture_job(url_b, match=r"/api/", limit=30)])
+"""
+
+import atexit
+import itertools
+import json
+import math
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Iterable, Optional
+
+WORKER_SCRIPT = Path(__file__).parent / "browser_worker.js"
+START_TIMEOUT = 60.0   # 启动浏览器的最长等待（秒）
+JOB_TIMEOUT = 60.0     # 单个抓取任务的默认超时（秒）
+MAX_TABS = 4           # 同时打开的标签页上限
+CAPTURE_IDLE = 2.0     # capture 模式滚动后等待新数据的时间（秒）
+CAPTURE_MAX_SCROLLS = 20
+
+# capture 模式识别 prompt 对象的字段名（对象自身或其 meta 下）
+PROMPT_KEYS = ("prompt", "main_prompt", "positive_prompt")
+
+# 默认拦截的资源类型（Playwright resourceType）和 host（含子域名）
+BLOCK_TYPES = ("font", "media")
+BLOCK_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "hotjar.com",
+    "segment.io",
+    "sentry.io",
+    "clarity.ms",
+    "facebook.net",
+)
+
+
+class BrowserError(Exception):
+    """worker 启动失败、异常退出，或任务在浏览器中执行出错"""
+
+
+def scrape_job(
+    url: str,
+    selector: str,
+    extract: str,
+    limit: int = 30,
+    wait_until: str = "domcontentloaded",
+    settle: float = 0,
+    scrolls: int = 0,
+    scroll_delay: float = 1.0,
+    timeout: float = JOB_TIMEOUT,
+    block: Optional[dict] = None,
+) -> dict:
+    """
+    构造一个抓取任务：导航到 url，等待 selector 出现（再等 settle 秒、滚动 scrolls 次），
+    对前 limit 个匹配元素执行 extract（JS 函数源码，参数为元素）。
+    block 为 {"types": [...], "hosts": [...]}，None 表示使用 worker 的默认拦截规则
+    """
+    job = {
+        "op": "scrape",
+        "url": url,
+        "selector": selector,
+        "extract": extract,
+        "limit": limit,
+        "waitUntil": wait_until,
+        "settle": int(settle * 1000),
+        "scrolls": scrolls,
+        "scrollDelay": int(scroll_delay * 1000),
+        "timeout": int(timeout * 1000),
+    }
+    if block is not None:
+        job["block"] = block
+    return job
+
+
+def capture_job(
+    url: str,
+    match: str,
+    limit: int = 30,
+    keys: Iterable[str] = PROMPT_KEYS,
+    idle: float = CAPTURE_IDLE,
+    max_scrolls: int = CAPTURE_MAX_SCROLLS,
+    timeout: float = JOB_TIMEOUT,
+    block: Optional[dict] = None,
+) -> dict:
+    """
+    构造一个 capture 任务：打开 url，收集 URL 匹配 match（正则）的 JSON 响应中带 keys 字段的对象，
+    返回原始对象（最多 limit 个）。timeout 是整个任务的时限
+    """
+    job = {
+        "op": "capture",
+        "url": url,
+        "match": match,
+        "keys": list(keys),
+        "limit": limit,
+        "idle": int(idle * 1000),
+        "maxScrolls": max_scrolls,
+        "timeout": int(timeout * 1000),
+    }
+    if block is not None:
+        job["block"] = block
+    return job
+
+
+def _budget(job: dict) -> float:
+    """任务在 worker 中最长的执行时间（秒）：导航超时 + 等待 + 滚动，再留出提取的余量"""
+    return (job.get("timeout", 0) + job.get("settle", 0)
+            + job.get("scrolls", 0) * job.get("scrollDelay", 0)) / 1000 + 10
+
+
+class BrowserWorker:
+    """常驻 Node 进程 + headless Chromium，按行 JSON 协议提交抓取任务"""
+
+    def __init__(
+        self,
+        script: str | Path = WORKER_SCRIPT,
+        node: Optional[str] = None,
+        cdp_url: Optional[str] = None,
+        start_timeout: float = START_TIMEOUT,
+        max_tabs: int = MAX_TABS,
+        block_types: Iterable[str] = BLOCK_TYPES,
+        block_hosts: Iterable[str] = BLOCK_HOSTS,
+    ):
+        self.script = Path(script)
+        self.node = node or shutil.which("node") or "node"
+        self.cdp_url = cdp_url
+        self.max_tabs = max(1, max_tabs)
+        self.block = {"types": list(block_types), "hosts": list(block_hosts)}
+        self.start_timeout = start_timeout
+        self._proc: Optional[subprocess.Popen] = None
+        self._pending: dict[int, Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()  # 启动 worker、写 stdin
+        self.stats = {"starts": 0, "jobs": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self) -> None:
+        with self._lock:
+            self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        if self.running:
+            return
+        env = dict(os.environ)
+        env["PV_BROWSER_TABS"] = str(self.max_tabs)
+        if self.cdp_url:
+            env["PV_BROWSER_CDP"] = self.cdp_url
+        try:
+            proc = subprocess.Popen(
+                [self.node, str(self.script)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                bufsize=1,
+                cwd=str(self.script.parent),
+                env=env,
+            )
+        except OSError as e:
+            raise BrowserError(f"cannot start browser worker: {e}") from e
+
+        ready: Future = Future()
+        self._proc, self._pending = proc, {}
+        threading.Thread(target=self._read, args=(proc, self._pending, ready),
+                         name="browser-worker-reader", daemon=True).start()
+        try:
+            ready.result(timeout=self.start_timeout)
+        except Exception as e:
+            proc.kill()
+            self._proc = None
+            if isinstance(e, BrowserError):
+                raise
+            raise BrowserError(f"browser worker did not start within {self.start_timeout:.0f}s") from e
+        self.stats["starts"] += 1
+
+    def _read(self, proc: subprocess.Popen, pending: dict[int, Future], ready: Future) -> None:
+        """读取 worker 输出，把结果交给对应的 Future；worker 退出后让未完成的任务失败"""
+        for line in proc.stdout:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue  # 非协议输出
+            if "ready" in msg:
+                if not ready.done():
+                    if msg["ready"]:
+                        ready.set_result(msg)
+                    else:
+                        ready.set_exception(BrowserError(f"browser launch failed: {msg.get('error')}"))
+                continue
+            with self._lock:
+                future = pending.pop(msg.get("id"), None)
+            if future is None:
+                continue
+            if msg.get("ok"):
+                future.set_result(msg)
+            else:
+                self.stats["failed"] += 1
+                future.set_exception(BrowserError(msg.get("error") or "unknown error"))
+
+        err = BrowserError(f"browser worker exited (code {proc.wait()})")
+        if not ready.done():
+            ready.set_exception(err)
+        with self._lock:
+            remaining = list(pending.values())
+            pending.clear()
+        for future in remaining:
+            future.set_exception(err)
+
+    def submit(self, job: dict) -> Future:
+        """提交一个任务（dict，见 browser_worker.js 的协议说明），返回完成时带整条响应的 Future"""
+        if job.get("op") in ("scrape", "capture") and "block" not in job:
+            job = {**job, "block": self.block}
+        future: Future = Future()
+        with self._lock:
+            self._ensure_started()
+            job_id = next(self._ids)
+            self._pending[job_id] = future
+            try:
+                self._proc.stdin.write(json.dumps({**job, "id": job_id}, ensure_ascii=False) + "\n")
+                self._proc.stdin.flush()
+            except OSError as e:
+                self._pending.pop(job_id, None)
+                raise BrowserError(f"browser worker is gone: {e}") from e
+            self.stats["jobs"] += 1
+        return future
+
+    def scrape(self, url: str, selector: str, extract: str, **options) -> list[dict]:
+        """抓取单个页面（参数见 scrape_job），失败时抛出 BrowserError"""
+        result = self.scrape_all([scrape_job(url, selector, extract, **options)])[0]
+        if isinstance(result, BrowserError):
+            raise result
+        return result
+
+    def capture(self, url: str, match: str, **options) -> list[dict]:
+        """capture 模式抓取单个页面（参数见 capture_job），失败时抛出 BrowserError"""
+        result = self.scrape_all([capture_job(url, match, **options)])[0]
+        if isinstance(result, BrowserError):
+            raise result
+        return result
+
+    def scrape_all(self, jobs: list[dict]) -> list[list[dict] | BrowserError]:
+        """
+        同时提交多个抓取任务（scrape_job / capture_job），按提交顺序返回各自的条目列表；
+        单个任务失败或超时时对应位置为 BrowserError，不影响其它任务
+        """
+        futures = [self.submit(job) for job in jobs]
+        # 超过 max_tabs 的任务要排队，按轮数放宽整体等待时间
+        rounds = math.ceil(len(jobs) / self.max_tabs) if jobs else 0
+        deadline = time.monotonic() + max((_budget(job) for job in jobs), default=0) * rounds
+        results: list[list[dict] | BrowserError] = []
+        for job, future in zip(jobs, futures):
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic()))["items"])
+            except BrowserError as e:
+                results.append(e)
+            except TimeoutError:
+                results.append(BrowserError(f"scrape timed out: {job.get('url')}"))
+        return results
+
+    def close(self, timeout: float = 10.0) -> None:
+        """关闭浏览器并结束 worker"""
+        with self._lock:
+            proc, self._proc = self._proc, None
+        if proc is None or proc.poll() is not None:
+            return
+        try:
+            proc.stdin.write('{"op": "close"}\n')
+            proc.stdin.flush()
+            proc.stdin.close()
+            proc.wait(timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+
+
+_default_worker: Optional[BrowserWorker] = None
+_default_lock = threading.Lock()
+
+
+def default_worker() -> BrowserWorker:
+    """进程内共享的 worker（所有浏览器抓取共用同一个浏览器）"""
+    global _default_worker
+    with _default_lock:
+        if _default_worker is None:
+            _default_worker = BrowserWorker(cdp_url=os.environ.get("PV_BROWSER_CDP"))
+            atexit.register(_default_worker.close)
+        return _default_worker
@@ -0,0 +1,320 @@
+#!/usr/bin/env node
+/**
+ * PromptVault Browser Worker
+ * Long-lived headless Chromium driven over stdin/stdout, one JSON object per line.
+ * Started once by browser_client.py; every scrape job after that only costs a page
+ * navigation (no npx package resolution, Node startup or browser attach per scrape).
+ *
+ * Protocol (stdout carries protocol messages only, logs go to stderr):
+ *   <- {"ready": true, "browser": "<version>"}            once the browser is up
+ *   -> {"id": 1, "op": "scrape", "url": "...", "selector": "article",
+ *       "extract": "el => ({...})", "limit": 30, "waitUntil": "networkidle",
+ *       "settle": 2000, "scrolls": 3, "scrollDelay": 1000, "timeout": 30000,
+ *       "block": {"types": ["font", "media"], "hosts": ["google-analytics.com"]}}
+ *   <- {"id": 1, "ok": true, "items": [...], "elapsed": 4.2}
+ *   <- {"id": 1, "ok": false, "error": "..."}
+ *   -> {"id": 2, "op": "capture", "url": "...", "match": "civitai\\.com/api/",
+ *       "keys": ["prompt"], "limit": 30, "idle": 2000, "maxScrolls": 20, "timeout": 30000}
+ *   <- {"id": 2, "ok": true, "items": [{...raw API object...}], "responses": 3, "scrolls": 2}
+ *   -> {"id": 3, "op": "ping"}  /  {"op": "close"}
+ *
+ * "capture" reads the page's own JSON XHR/fetch responses (URL matching "match") plus
+ * Next.js __NEXT_DATA__, and keeps every object that has a non-empty string under one
+ * of "keys" (directly or under .meta). It scrolls again as soon as a response has been
+ * parsed and stops once "limit" objects are captured, or after two scrolls in a row
+ * bring nothing within "idle" ms.
+ *
+ * Jobs run concurrently, each on its own tab from a pool shared by the one browser
+ * connection (at most PV_BROWSER_TABS tabs, default 4); replies come back in
+ * completion order. "block" aborts requests by resource type or host suffix.
+ *
+ * PV_BROWSER_CDP=http://localhost:9222 attaches to a running browser instead of
+ * launching headless Chromium.
+ */
+
+const path = require('path');
+const readline = require('readline');
+const { execSync } = require('child_process');
+
+function log(msg) {
+  process.stderr.write(`[browser-worker] ${msg}\n`);
+}
+
+function reply(msg) {
+  process.stdout.write(JSON.stringify(msg) + '\n');
+}
+
+function loadPlaywright() {
+  try {
+    return require('playwright');
+  } catch (e) {
+    // `npm install -g playwright` is not on the default require path
+    const root = execSync('npm root -g', { encoding: 'utf8' }).trim();
+    return require(path.join(root, 'playwright'));
+  }
+}
+
+const MAX_TABS = Math.max(1, parseInt(process.env.PV_BROWSER_TABS, 10) || 4);
+
+let browser = null;
+let context = null;
+
+async function launch() {
+  const { chromium } = loadPlaywright();
+  const cdp = process.env.PV_BROWSER_CDP;
+  if (cdp) {
+    browser = await chromium.connectOverCDP(cdp);
+    context = browser.contexts()[0] || await browser.newContext();
+  } else {
+    browser = await chromium.launch({ headless: true });
+    context = await browser.newContext();
+  }
+  browser.on('disconnected', () => {
+    log('browser disconnected');
+    process.exit(1);
+  });
+}
+
+// Tab pool: idle tabs are reused, new ones opened up to MAX_TABS, further jobs wait
+const idle = [];
+const waiting = [];
+let openTabs = 0;
+
+async function acquirePage() {
+  while (idle.length) {
+    const p = idle.pop();
+    if (!p.isClosed()) return p;
+    openTabs--;
+  }
+  if (openTabs < MAX_TABS) {
+    openTabs++;
+    try {
+      return await context.newPage();
+    } catch (e) {
+      openTabs--;
+      throw e;
+    }
+  }
+  await new Promise(resolve => waiting.push(resolve));
+  return acquirePage();
+}
+
+function releasePage(p) {
+  if (p.isClosed()) openTabs--;
+  else idle.push(p);
+  const next = waiting.shift();
+  if (next) next();
+}
+
+function hostOf(url) {
+  try {
+    return new URL(url).hostname;
+  } catch (e) {
+    return '';
+  }
+}
+
+async function applyBlocking(p, block) {
+  const types = new Set((block && block.types) || []);
+  const hosts = (block && block.hosts) || [];
+  if (!types.size && !hosts.length) return false;
+  await p.route('**/*', route => {
+    const req = route.request();
+    const host = hostOf(req.url());
+    if (types.has(req.resourceType()) || hosts.some(h => host === h || host.endsWith('.' + h))) {
+      return route.abort();
+    }
+    return route.continue();
+  });
+  return true;
+}
+
+async function scrape(job) {
+  const timeout = job.timeout || 30000;
+  const p = await acquirePage();
+  let routed = false;
+  try {
+    routed = await applyBlocking(p, job.block);
+    await p.goto(job.url, { waitUntil: job.waitUntil || 'domcontentloaded', timeout });
+    if (job.selector) {
+      await p.waitForSelector(job.selector, { timeout }).catch(() => {});
+    }
+    if (job.settle) await p.waitForTimeout(job.settle);
+    for (let i = 0; i < (job.scrolls || 0); i++) {
+      await p.evaluate(() => window.scrollBy(0, window.innerHeight));
+      await p.waitForTimeout(job.scrollDelay || 1000);
+    }
+    // Evaluated as a string over CDP, so the page's CSP does not block the extract function
+    const expr = `Array.from(document.querySelectorAll(${JSON.stringify(job.selector)}))`
+      + `.slice(0, ${Number(job.limit) || 1000}).map(${job.extract})`;
+    return await p.evaluate(expr);
+  } finally {
+    if (routed && !p.isClosed()) await p.unroute('**/*').catch(() => {});
+    releasePage(p);
+  }
+}
+
+function promptOf(obj, keys) {
+  const meta = obj.meta && typeof obj.meta === 'object' ? obj.meta : null;
+  for (const key of keys) {
+    for (const v of [obj[key], meta && meta[key]]) {
+      if (typeof v === 'string' && v.trim()) return v;
+    }
+  }
+  return null;
+}
+
+// Walk a JSON body and collect objects that carry a prompt (outermost match wins)
+function collect(node, keys, out, seen, limit, depth = 0) {
+  if (out.length >= limit || depth > 16 || !node || typeof node !== 'object') return;
+  if (Array.isArray(node)) {
+    for (const child of node) collect(child, keys, out, seen, limit, depth + 1);
+    return;
+  }
+  const text = promptOf(node, keys);
+  if (text) {
+    const key = node.id != null ? `id:${node.id}` : text;
+    if (!seen.has(key)) {
+      seen.add(key);
+      out.push(node);
+    }
+    return;
+  }
+  for (const child of Object.values(node)) collect(child, keys, out, seen, limit, depth + 1);
+}
+
+async function capture(job) {
+  const timeout = job.timeout || 30000;
+  const deadline = Date.now() + timeout;
+  const limit = Number(job.limit) || 1000;
+  const keys = job.keys || ['prompt'];
+  const match = new RegExp(job.match || '.');
+  const idleMs = job.idle || 2000;
+  const maxScrolls = job.maxScrolls == null ? 20 : job.maxScrolls;
+  const items = [];
+  const seen = new Set();
+  let responses = 0;
+  let version = 0;
+  let notify = [];
+
+  const arrived = () => {
+    version++;
+    notify.splice(0).forEach(wake => wake());
+  };
+  // Resolves true as soon as something new is captured after `since`, false after `ms`
+  const arrivalSince = (since, ms) => {
+    if (version > since) return Promise.resolve(true);
+    return new Promise(resolve => {
+      const timer = setTimeout(() => resolve(false), Math.max(0, ms));
+      notify.push(() => { clearTimeout(timer); resolve(true); });
+    });
+  };
+
+  const onResponse = async resp => {
+    const type = resp.request().resourceType();
+    if ((type !== 'xhr' && type !== 'fetch') || !match.test(resp.url())) return;
+    if (!(resp.headers()['content-type'] || '').includes('json')) return;
+    try {
+      const before = items.length;
+      collect(await resp.json(), keys, items, seen, limit);
+      responses++;
+      if (items.length > before) arrived();
+    } catch (e) {
+      // body gone after navigation, or not JSON after all
+    }
+  };
+
+  const p = await acquirePage();
+  let routed = false;
+  p.on('response', onResponse);
+  try {
+    routed = await applyBlocking(p, job.block);
+    await p.goto(job.url, { waitUntil: 'domcontentloaded', timeout });
+    // First page is often server-rendered into the HTML rather than fetched
+    const nextData = await p.evaluate(
+      () => document.getElementById('__NEXT_DATA__')?.textContent || null
+    ).catch(() => null);
+    if (nextData) {
+      try {
+        const before = items.length;
+        collect(JSON.parse(nextData), keys, items, seen, limit);
+        if (items.length > before) arrived();
+      } catch (e) {
+        // malformed embedded data
+      }
+    }
+
+    let scrolls = 0;
+    let misses = 0;
+    let since = 0;
+    // Give the app a little longer than `idle` to issue its first request
+    if (!(await arrivalSince(0, Math.min(idleMs * 3, deadline - Date.now())))) misses++;
+    while (items.length < limit && Date.now() < deadline && scrolls < maxScrolls && misses < 2) {
+      since = version;
+      await p.evaluate(() => window.scrollTo(0, document.documentElement.scrollHeight));
+      scrolls++;
+      const got = await arrivalSince(since, Math.min(idleMs, deadline - Date.now()));
+      misses = got ? 0 : misses + 1;
+    }
+    return { items: items.slice(0, limit), responses, scrolls };
+  } finally {
+    p.off('response', onResponse);
+    notify = [];
+    if (routed && !p.isClosed()) await p.unroute('**/*').catch(() => {});
+    releasePage(p);
+  }
+}
+
+async function shutdown(code) {
+  try {
+    if (browser) await browser.close();
+  } catch (e) {
+    // already gone
+  }
+  process.exit(code);
+}
+
+async function handle(job) {
+  const started = Date.now();
+  try {
+    if (job.op === 'close') return await shutdown(0);
+    if (job.op === 'ping') return reply({ id: job.id, ok: true });
+    if (job.op === 'capture') {
+      const result = await capture(job);
+      return reply({ id: job.id, ok: true, ...result, elapsed: (Date.now() - started) / 1000 });
+    }
+    if (job.op !== 'scrape') throw new Error(`unknown op: ${job.op}`);
+    const items = await scrape(job);
+    reply({ id: job.id, ok: true, items, elapsed: (Date.now() - started) / 1000 });
+  } catch (e) {
+    reply({ id: job.id, ok: false, error: String(e && e.message || e).split('\n')[0] });
+  }
+}
+
+async function main() {
+  try {
+    await launch();
+  } catch (e) {
+    reply({ ready: false, error: String(e && e.message || e).split('\n')[0] });
+    process.exit(1);
+  }
+  reply({ ready: true, browser: browser.version() });
+
+  const running = new Set();
+  const rl = readline.createInterface({ input: process.stdin });
+  rl.on('line', line => {
+    if (!line.trim()) return;
+    let job;
+    try {
+      job = JSON.parse(line);
+    } catch (e) {
+      reply({ ok: false, error: 'invalid JSON job' });
+      return;
+    }
+    const task = handle(job).finally(() => running.delete(task));
+    running.add(task);
+  });
+  rl.on('close', () => { Promise.allSettled([...running]).then(() => shutdown(0)); });
+}
+
+main();
@@ -4,21 +4,40 @@ PromptVault 统一采集入口
 用法:
     python3 scrapers/collect.py --source civitai --limit 50
     python3 scrapers/collect.py --source all --limit 30
+    python3 scrapers/collect.py --source all --limit 30 --merge --concurrency 3 --deadline 90
+    python3 scrapers/collect.py --source civitai --limit 50 --full  # 忽略水位线，从 feed 顶部重新抓取
+    python3 scrapers/collect.py --source prompthero --ignore-health  # 熔断中的数据源也强制尝试
     python3 scrapers/collect.py --list
     python3 scrapers/collect.py --source civitai --limit 50 --merge --filter
     python3 scrapers/collect.py --audit data/prompts.json  # 审查已有数据
+    python3 scrapers/collect.py --audit data/prompts.json --image-check  # 同时检测图片内容
+    python3 scrapers/collect.py --compact                  # 合并 segment log 到 prompts.json
+    python3 scrapers/collect.py --retag                    # 按当前规则重新打标
 """
 
 import argparse
-import json
+import os
+import queue
 import sys
+import threading
+import time
+from collections import Counter
 from pathlib import Path
+from typing import Iterator, Optional
 
 # 确保 scrapers 目录在 path 中
 sys.path.insert(0, str(Path(__file__).parent))
 
 from base_adapter import list_adapters, get_adapter, _registry
+from fingerprint import record_fingerprint, record_text
+from audit_cache import AuditCache
 from content_filter import ContentFilter
+from image_checker import ImageChecker
+from pipeline import Pipeline
+from prompt_store import PromptStore
+from source_health import SourceHealth
+from tagging import RULES_VERSION, infer_batch, is_current
+from watermarks import WatermarkStore
 
 # 导入所有 adapter（触发 @register_adapter 注册）
 import adapter_civitai
@@ -26,70 +45,28 @@ import adapter_prompthero
 import adapter_midjourney
 
 
-def merge_to_prompts_json(source_file: Path, prompts_file: Path, enable_filter: bool = True) -> dict:
-    """将采集结果合并到主 prompts.json，返回统计信息"""
-    existing = json.loads(prompts_file.read_text()) if prompts_file.exists() else []
-    new_items = json.loads(source_file.read_text())
-
-    # ========== 内容合规审查 ==========
-    filter_stats = {}
-    if enable_filter:
-        cf = ContentFilter()
-        safe_items, review_items, blocked_items = cf.filter_items(new_items)
-        cf.print_stats()
-        filter_stats = cf.stats
-
-        if blocked_items:
-            print(f"  ⛔ Blocked {len(blocked_items)} items (NSFW/违规)")
-            for item in blocked_items:
-                print(f"     - {item.get('id', '?')}: {item.get('prompt', '')[:60]}...")
-
-        if review_items:
-            print(f"  ⚠️  Flagged {len(review_items)} items for review (saved to filter_logs/)")
-
-        # 只合并安全的内容
-        new_items = safe_items
-    # ==================================
-
-    # 基于 prompt 文本去重（简单版：前100字符匹配）
-    existing_prefixes = {p["prompt"][:100].lower().strip() for p in existing}
-    added = []
-    skipped = 0
-
-    # 计算新 ID 起始序号
-    max_idx = len(existing)
-    for item in new_items:
-        prefix = item["prompt"][:100].lower().strip()
-        if prefix in existing_prefixes:
-            skipped += 1
-            continue
-        max_idx += 1
-        item["id"] = f"{item['id'].split('_')[0]}_{item['id'].split('_')[1]}_{max_idx:03d}"
-        existing.append(item)
-        existing_prefixes.add(prefix)
-        added.append(item["id"])
-
-    prompts_file.write_text(json.dumps(existing, ensure_ascii=False, indent=2))
-    return {
-        "added": len(added),
-        "skipped": skipped,
-        "total": len(existing),
-        "filter": filter_stats,
-    }
-
-
-def audit_existing(prompts_file: Path) -> None:
-    """审查已有 prompts.json 中的内容合规性"""
+def audit_existing(prompts_file: Path, use_cache: bool = True, workers: int = 1,
+                   image_checker: ImageChecker | None = None) -> None:
+    """审查已有 prompts.json 中的内容合规性（默认只检查上次审查后新增或变化的条目）"""
     if not prompts_file.exists():
         print(f"File not found: {prompts_file}")
         return
 
-    items = json.loads(prompts_file.read_text())
+    store = PromptStore(prompts_file)
+    items = store.load()
     print(f"\n🔍 Auditing {len(items)} existing prompts...\n")
 
-    cf = ContentFilter()
-    safe, review, blocked = cf.filter_items(items)
+    backend = image_checker.fingerprint if image_checker is not None else ""
+    cache = AuditCache(image_backend=backend) if use_cache else None
+    cf = ContentFilter(image_checker=image_checker)
+    safe, review, blocked = cf.filter_items(items, cache=cache, workers=workers)
     cf.print_stats()
+    if image_checker is not None:
+        image_checker.close()
+        print(f"  Image check: {image_checker.stats()}")
+    if cache is not None:
+        print(f"  Audit cache: {cache.hits} reused, {cache.misses} checked")
+        cache.save(prune=True)
 
     if blocked:
         print(f"\n⛔ Found {len(blocked)} items that should be REMOVED:")
@@ -99,10 +76,9 @@ def audit_existing(prompts_file: Path) -> None:
         # 自动清理
         answer = input(f"\nRemove {len(blocked)} blocked items? [y/N] ").strip().lower()
         if answer == "y":
-            blocked_ids = {item.get("id") for item in blocked}
-            cleaned = [item for item in items if item.get("id") not in blocked_ids]
-            prompts_file.write_text(json.dumps(cleaned, ensure_ascii=False, indent=2))
-            print(f"✅ Removed {len(blocked)} items. {len(cleaned)} remaining.")
+            store.delete([item.get("id") for item in blocked])
+            store.compact()
+            print(f"✅ Removed {len(blocked)} items. {store.count} remaining.")
         else:
             print("Skipped. Check filter_logs/ for details.")
 
@@ -117,50 +93,231 @@ def audit_existing(prompts_file: Path) -> None:
         print("\n✅ All items passed compliance check!")
 
 
+def run_adapters(
+    sources: list[str],
+    limit: int,
+    near_dup=None,
+    dedup=None,
+    concurrency: int = 4,
+    deadline: Optional[float] = None,
+    watermarks: Optional[WatermarkStore] = None,
+    health: Optional[SourceHealth] = None,
+) -> Iterator[tuple[str, Optional[Path], Optional[Exception]]]:
+    """并发运行多个 adapter，按完成顺序逐个产出 (source, 输出文件, 异常)
+
+    最多 concurrency 个 adapter 同时采集；deadline 秒后不再等待尚未完成的 adapter
+    （工作线程为 daemon，进程退出时直接丢弃），总耗时约为 max(adapter) 而非 sum(adapter)。
+    """
+    results: queue.Queue = queue.Queue()
+    slots = threading.Semaphore(max(1, concurrency))
+
+    def worker(source_name: str) -> None:
+        with slots:
+            try:
+                adapter = get_adapter(source_name, watermarks=watermarks, health=health)
+                results.put((source_name, adapter.run(limit=limit, near_dup=near_dup, dedup=dedup), None))
+            except Exception as e:
+                results.put((source_name, None, e))
+
+    for source_name in sources:
+        threading.Thread(target=worker, args=(source_name,), name=f"adapter-{source_name}", daemon=True).start()
+
+    end = time.monotonic() + deadline if deadline else None
+    pending = set(sources)
+    while pending:
+        timeout = max(0.0, end - time.monotonic()) if end is not None else None
+        try:
+            source_name, output_file, error = results.get(timeout=timeout)
+        except queue.Empty:
+            print(f"[WARN] Deadline reached, abandoning: {', '.join(sorted(pending))}")
+            return
+        pending.discard(source_name)
+        yield source_name, output_file, error
+
+
+def retag_existing(prompts_file: Path, workers: int = 1, include_legacy: bool = False) -> None:
+    """增量重打标：只重新推断规则版本落后或 prompt 已变化的记录
+
+    手工打标的记录（tagging.manual）始终跳过；没有 tagging 记录的历史数据
+    默认也跳过（无法区分是否手工打标），include_legacy=True 时一并重打标。
+    """
+    if not prompts_file.exists():
+        print(f"File not found: {prompts_file}")
+        return
+
+    store = PromptStore(prompts_file)
+    items = store.load()
+    print(f"\n🏷️  Re-tagging {len(items)} prompts (rules v{RULES_VERSION})...")
+
+    # store.update 按 id 覆盖，id 缺失或重复的历史记录无法安全写回，跳过
+    id_counts = Counter(item.get("id") for item in items)
+    skipped = Counter()
+    stale = []
+    for item in items:
+        info = item.get("tagging")
+        if not item.get("id") or id_counts[item["id"]] > 1:
+            skipped["missing / duplicate id"] += 1
+        elif info is None and not include_legacy:
+            skipped["legacy"] += 1
+        elif info is not None and info.get("manual"):
+            skipped["manual"] += 1
+        else:
+            fp = record_fingerprint(item)
+            content_hash = fp.short if fp else ""
+            if is_current(item, content_hash):
+                skipped["up to date"] += 1
+            else:
+                stale.append((item, content_hash))
+
+    t0 = time.monotonic()
+    results = infer_batch([record_text(item) for item, _ in stale], workers=workers)
+    changed = 0
+    for (item, content_hash), (tags, style) in zip(stale, results):
+        if item.get("tags") != tags or item.get("style") != style:
+            changed += 1
+        item["tags"] = list(tags)
+        item["style"] = style
+        item["tagging"] = {"rules": RULES_VERSION, "hash": content_hash}
+    elapsed = time.monotonic() - t0
+
+    if stale:
+        store.update([item for item, _ in stale])
+        store.maybe_compact()
+    print(f"  Re-tagged {len(stale)} records in {elapsed:.2f}s ({changed} with new tags / style)")
+    if skipped:
+        print("  Skipped: " + ", ".join(f"{n} {reason}" for reason, n in skipped.items()))
+
+
 def main():
     parser = argparse.ArgumentParser(description="PromptVault Prompt Collector")
     parser.add_argument("--source", type=str, help="Source adapter name or 'all'")
     parser.add_argument("--limit", type=int, default=50, help="Max prompts per source")
     parser.add_argument("--list", action="store_true", help="List available adapters")
-    parser.add_argument("--merge", action="store_true", help="Auto-merge to prompts.json")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Max adapters fetching at the same time (--source all)")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="Stop waiting for adapters after N seconds and merge what finished")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore crawl watermarks and fetch from the top of each feed")
+    parser.add_argument("--ignore-health", action="store_true",
+                        help="Try endpoints even if their circuit breaker is open (results are still recorded)")
+    parser.add_argument("--merge", action="store_true",
+                        help="Stream fetched prompts through filter / dedup / tagging into prompts.json")
     parser.add_argument("--filter", action="store_true", default=True,
                         help="Enable content filter (default: on)")
     parser.add_argument("--no-filter", action="store_true", help="Disable content filter")
     parser.add_argument("--audit", type=str, help="Audit existing prompts.json for compliance")
+    parser.add_argument("--retag", action="store_true",
+                        help="Re-infer tags / style for records tagged by an older rule version "
+                             "(~15-35k prompts/s per worker process, with or without NumPy; "
+                             "uses all CPUs unless --workers is given)")
+    parser.add_argument("--include-legacy", action="store_true",
+                        help="With --retag, also re-tag records that predate tagging provenance")
+    parser.add_argument("--no-audit-cache", action="store_true",
+                        help="Re-check every item instead of reusing cached audit results")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Audit / re-tag with N worker processes (default: 1 for --audit, "
+                             "all CPUs for --retag)")
+    parser.add_argument("--image-check", action="store_true",
+                        help="Also classify image content (runs alongside text checks)")
+    parser.add_argument("--image-workers", type=int, default=4,
+                        help="Threads for image download / classification")
     parser.add_argument("--prompts-file", type=str, default="data/prompts.json",
                         help="Path to prompts.json")
+    parser.add_argument("--compact", action="store_true",
+                        help="Compact pending segment log into prompts.json")
+    parser.add_argument("--near-dup-threshold", type=float, default=0.8,
+                        help="MinHash similarity above which prompts count as near-duplicates")
     args = parser.parse_args()
 
+    image_checker = ImageChecker(workers=args.image_workers) if args.image_check else None
+
     # 审查模式
     if args.audit:
-        audit_existing(Path(args.audit))
+        audit_existing(Path(args.audit), use_cache=not args.no_audit_cache, workers=args.workers or 1,
+                       image_checker=image_checker)
+        return
+
+    # 重打标模式
+    if args.retag:
+        retag_existing(Path(args.prompts_file), workers=args.workers or os.cpu_count() or 1,
+                       include_legacy=args.include_legacy)
         return
 
     if args.list:
+        health = SourceHealth()
         print("Available adapters:")
         for name in list_adapters():
             adapter_cls = _registry[name]
             print(f"  - {name}: {adapter_cls.display_name} ({adapter_cls.base_url})")
+            for endpoint in adapter_cls.endpoints:
+                key = f"{name}:{endpoint}"
+                health.get(key, adapter_cls.known_broken.get(endpoint))
+                print(f"      {endpoint}: {health.describe(key)}")
         return
 
     if not args.source:
+        if args.compact:
+            store = PromptStore(args.prompts_file)
+            pending = store.pending
+            store.compact()
+            print(f"Compacted {pending} pending entries, {store.count} total")
+            return
         parser.print_help()
         return
 
     enable_filter = not args.no_filter
     sources = list_adapters() if args.source == "all" else [args.source]
+    store = (PromptStore(args.prompts_file, near_dup_threshold=args.near_dup_threshold)
+             if args.merge else None)
 
-    for source_name in sources:
-        try:
-            adapter = get_adapter(source_name)
-            output_file = adapter.run(limit=args.limit)
-
-            if args.merge:
-                prompts_path = Path(args.prompts_file)
-                stats = merge_to_prompts_json(output_file, prompts_path, enable_filter=enable_filter)
-                print(f"  Merged: +{stats['added']} new, {stats['skipped']} duplicates, {stats['total']} total")
-        except Exception as e:
-            print(f"[ERROR] {source_name}: {e}")
+    # 增量抓取水位线（仅 --merge 时保存）：--full 时清掉这些数据源的旧水位线，本次入库后重新建立
+    watermarks = WatermarkStore()
+    if args.full:
+        for source_name in sources:
+            watermarks.reset(source_name)
+    # endpoint 健康状态：熔断中的 endpoint 直接跳过，不再每次等待超时
+    health = SourceHealth(force=args.ignore_health)
+
+    if args.merge:
+        # 流式合并：各 adapter 逐条产出，经审查 / 去重 / 打标后分批写入 store，不落中间文件
+        adapters = [get_adapter(name, watermarks=watermarks, health=health) for name in sources]
+        cf = ContentFilter(image_checker=image_checker) if enable_filter else None
+        pipeline = Pipeline(store, content_filter=cf, concurrency=args.concurrency)
+        pipeline.run([(adapter, args.limit) for adapter in adapters], deadline=args.deadline)
+        for name in sources:
+            if name in pipeline.errors:
+                print(f"[ERROR] {name}: {pipeline.errors[name]}")
+            print(f"  Merged {name}: {pipeline.summary(name)}")
+        for stage, error in pipeline.errors.items():
+            if stage.startswith("stage:"):
+                print(f"[ERROR] {stage}: {error}")
+        if cf is not None:
+            cf.print_stats()
+        print(f"  Total: {store.count}")
+        # 只有入库（或确定丢弃）的条目推进了水位线，写入 store 后才保存
+        watermarks.save()
+    else:
+        # 各 adapter 并发采集，结果写入 scrapers/output/ 下的 JSON 文件。
+        # 这些文件不会入库，因此不保存水位线，以免之后的 --merge 把这些页面当作已抓取跳过
+        for source_name, output_file, error in run_adapters(
+            sources, args.limit, concurrency=args.concurrency, deadline=args.deadline,
+            watermarks=watermarks, health=health,
+        ):
+            if error is not None:
+                print(f"[ERROR] {source_name}: {error}")
+
+    health.save()
+
+    if image_checker is not None:
+        image_checker.close()
+        print(f"  Image check: {image_checker.stats()}")
+
+    if store is not None:
+        if args.compact:
+            store.compact()
+        elif store.maybe_compact():
+            print(f"  Compacted segment log into {store.prompts_file}")
 
 
 if __name__ == "__main__":
@@ -8,12 +8,18 @@ PromptVault Content Filter — 内容合规审查模块
     safe_items, blocked = cf.filter_items(items)
 """
 
+import hashlib
 import json
 import re
 import logging
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
+
+from filter_log import FilterLogWriter
+from keyword_automaton import KeywordAutomaton
 
 logger = logging.getLogger("content_filter")
 
@@ -54,12 +60,59 @@ REVIEW_KEYWORDS_L2 = [
     "吸毒", "毒品",
 ]
 
+# L1 + L2 编译成一个 Aho-Corasick 自动机（import 时构建一次），单次扫描得到两级全部命中
+_L1_COUNT = len(BLOCK_KEYWORDS_L1)
+KEYWORD_AUTOMATON = KeywordAutomaton(BLOCK_KEYWORDS_L1 + REVIEW_KEYWORDS_L2)
+
+
+def match_keywords(text_lower: str) -> tuple[list[str], list[str]]:
+    """返回 (L1 命中, L2 命中)，各自按关键词列表中的顺序排列"""
+    hits = sorted(KEYWORD_AUTOMATON.search(text_lower))
+    l1 = [BLOCK_KEYWORDS_L1[i] for i in hits if i < _L1_COUNT]
+    l2 = [REVIEW_KEYWORDS_L2[i - _L1_COUNT] for i in hits if i >= _L1_COUNT]
+    return l1, l2
+
+
 # URL 路径中的 NSFW 标记
 NSFW_URL_PATTERNS = [
     r"/nsfw/", r"/adult/", r"/xxx/", r"/porn/",
     r"nsfw=true", r"rating=explicit", r"rating=x",
 ]
 
+# 全部模式编译成一个交替正则，绝大多数 URL 一次扫描即可排除
+_URL_PATTERN_RES = [re.compile(p) for p in NSFW_URL_PATTERNS]
+_URL_ALTERNATION = re.compile("|".join(f"(?:{p})" for p in NSFW_URL_PATTERNS))
+
+
+@lru_cache(maxsize=100_000)
+def match_url_pattern(url_lower: str) -> Optional[str]:
+    """返回 URL（已小写）命中的第一个 NSFW 模式（按列表顺序），结果按 URL 缓存"""
+    if not _URL_ALTERNATION.search(url_lower):
+        return None
+    for pattern, regex in zip(NSFW_URL_PATTERNS, _URL_PATTERN_RES):
+        if regex.search(url_lower):
+            return pattern
+    return None
+
+
+# 并行审查时每个 worker 任务的最大条目数
+PARALLEL_CHUNK_SIZE = 2000
+
+# 批量审查时每个图片检测线程对应的在途条目数
+IMAGE_WINDOW_PER_WORKER = 4
+
+# 审查逻辑（阈值、分级规则）变化时递增，使审查缓存失效
+RULESET_VERSION = 1
+
+
+def ruleset_fingerprint(image_backend: str = "") -> str:
+    """规则集指纹：关键词列表 + URL 模式 + 逻辑版本（+ 图片检测后端及阈值，见 ImageChecker.fingerprint）"""
+    payload = json.dumps(
+        [RULESET_VERSION, BLOCK_KEYWORDS_L1, REVIEW_KEYWORDS_L2, NSFW_URL_PATTERNS, image_backend],
+        ensure_ascii=False,
+    )
+    return hashlib.md5(payload.encode()).hexdigest()
+
 
 class FilterResult:
     """单条内容的审查结果"""
@@ -88,6 +141,29 @@ class FilterResult:
             "reasons": self.reasons,
         }
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "FilterResult":
+        result = cls(item_id=data["id"], prompt_preview=data["prompt_preview"])
+        result.blocked = data["blocked"]
+        result.needs_review = data["needs_review"]
+        result.reasons = list(data["reasons"])
+        return result
+
+
+# 进程池 worker 内的过滤器，由 _init_worker 在每个 worker 启动时创建一次
+_worker_filter: Optional["ContentFilter"] = None
+
+
+def _init_worker(log_dir: str) -> None:
+    """进程池 initializer：创建只做文本 / URL 审查的过滤器（图片检测留在主进程）"""
+    global _worker_filter
+    _worker_filter = ContentFilter(log_dir=log_dir, image_checker=None)
+
+
+def _check_chunk(items: list[dict]) -> list[dict]:
+    """进程池 worker：审查一批条目（自动机在 worker import 本模块时已编译好）"""
+    return [_worker_filter.check_item(item).to_dict() for item in items]
+
 
 class ContentFilter:
     """
@@ -96,12 +172,13 @@ class ContentFilter:
     三层防线:
     1. Prompt 文本关键词检测（L1 硬拦截 + L2 软标记）
     2. 图片 URL 模式检测
-    3. 可扩展的图片内容检测接口（预留）
+    3. 图片内容检测（可选，传入 image_checker.ImageChecker，与文本检测异步并行）
     """
 
-    def __init__(self, log_dir: str = "scrapers/output/filter_logs"):
+    def __init__(self, log_dir: str = "scrapers/output/filter_logs", image_checker=None):
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.image_checker = image_checker
         self._stats = {"total": 0, "passed": 0, "blocked": 0, "flagged": 0}
 
     def check_prompt_text(self, text: str, result: FilterResult) -> None:
@@ -112,18 +189,14 @@ class ContentFilter:
         else:
             main_part = text
         text_lower = main_part.lower()
+        l1_hits, hits = match_keywords(text_lower)
 
         # L1: 硬性拦截（仅检查主 prompt 部分）
-        for kw in BLOCK_KEYWORDS_L1:
-            if kw.lower() in text_lower:
-                result.block(f"L1 keyword hit: '{kw}'")
-                return  # 一个就够了
+        if l1_hits:
+            result.block(f"L1 keyword hit: '{l1_hits[0]}'")
+            return  # 一个就够了
 
         # L2: 软性标记
-        hits = []
-        for kw in REVIEW_KEYWORDS_L2:
-            if kw.lower() in text_lower:
-                hits.append(kw)
         if len(hits) >= 2:
             # 多个 L2 关键词同时出现，标记审核
             result.flag(f"L2 multiple hits: {hits[:5]}")
@@ -134,11 +207,28 @@ class ContentFilter:
     def check_image_urls(self, urls: list[str], result: FilterResult) -> None:
         """检查图片 URL 是否包含 NSFW 标记"""
         for url in urls:
-            url_lower = url.lower()
-            for pattern in NSFW_URL_PATTERNS:
-                if re.search(pattern, url_lower):
-                    result.block(f"NSFW URL pattern: '{pattern}' in {url[:100]}")
-                    return
+            pattern = match_url_pattern(url.lower())
+            if pattern is not None:
+                result.block(f"NSFW URL pattern: '{pattern}' in {url[:100]}")
+                return
+
+    def check_image_content(self, verdicts: list, result: FilterResult) -> bool:
+        """
+        应用图片检测结果（verdicts 为 ImageChecker.submit 返回的 Future 列表）。
+        返回结果是否已确定：有图片下载 / 解码失败（unknown）且未被拦截时为 False
+        """
+        decided = True
+        for future in verdicts:
+            verdict = future.result()
+            score = f"{verdict.score:.2f}" if verdict.score is not None else "-"
+            if verdict.label == "block":
+                result.block(f"Image content ({verdict.backend}, score {score}): {verdict.url[:100]}")
+                return True
+            if verdict.label == "review" and not result.needs_review:
+                result.flag(f"Image content ({verdict.backend}, score {score}): {verdict.url[:100]}")
+            elif verdict.label == "unknown":
+                decided = False
+        return decided
 
     def check_item(self, item: dict) -> FilterResult:
         """审查单条 prompt item"""
@@ -160,10 +250,49 @@ class ContentFilter:
 
         return result
 
-    def filter_items(self, items: list[dict]) -> tuple[list[dict], list[dict], list[dict]]:
+    def _iter_results(self, items: list[dict], cache, workers: int) -> Iterator[tuple[FilterResult, bool]]:
+        """按输入顺序逐条产出 (文本 / URL 审查结果, 是否新计算)，优先复用缓存"""
+        if workers <= 1:
+            for item in items:
+                result = cache.get(item) if cache is not None else None
+                if result is not None:
+                    yield result, False
+                else:
+                    yield self.check_item(item), True
+            return
+
+        # 并行：按窗口分批，未命中缓存的条目分片交给进程池，内存只与窗口大小有关
+        window = workers * PARALLEL_CHUNK_SIZE * 4
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(str(self.log_dir),)) as pool:
+            for start in range(0, len(items), window):
+                batch = items[start:start + window]
+                cached = [cache.get(item) if cache is not None else None for item in batch]
+                pending = [item for item, result in zip(batch, cached) if result is None]
+                chunk_size = max(1, -(-len(pending) // (workers * 4)))
+                chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+                fresh = (
+                    FilterResult.from_dict(data)
+                    for chunk_results in pool.map(_check_chunk, chunks)
+                    for data in chunk_results
+                )
+                for result in cached:
+                    yield (next(fresh), True) if result is None else (result, False)
+
+    def filter_items(
+        self, items: list[dict], cache=None, workers: int = 1
+    ) -> tuple[list[dict], list[dict], list[dict]]:
         """
         批量过滤。
 
+        Args:
+            items: 待审查条目
+            cache: 可选的 AuditCache，命中的条目直接复用上次结果，新结果写入缓存
+            workers: >1 时把未命中缓存的条目分片交给进程池并行审查，结果仍按原顺序合并
+        启用 image_checker 时，文本 / URL 审查未拦截的条目才提交图片检测，最多
+        IMAGE_WINDOW_PER_WORKER × 图片线程数 条在途：后续条目的文本检测与前面条目的
+        图片下载打分并行，逐条按输入顺序汇总。图片检测失败（unknown）的结果不写入缓存，
+        下次运行重新检测。
         Returns:
             (safe_items, review_items, blocked_items)
             - safe_items: 通过审查，可以直接使用
@@ -171,42 +300,54 @@ class ContentFilter:
             - blocked_items: 直接拦截
         """
         safe, review, blocked = [], [], []
-        all_results = []
-
-        for item in items:
-            self._stats["total"] += 1
-            result = self.check_item(item)
-            all_results.append(result)
-
-            if result.blocked:
-                self._stats["blocked"] += 1
+        # 命中的结果一经判定就写入 JSONL 日志，不在内存中保留全部 FilterResult
+        log = FilterLogWriter(self.log_dir)
+        checker = self.image_checker
+        window = IMAGE_WINDOW_PER_WORKER * checker.workers if checker is not None else 0
+        pending: deque = deque()  # (item, result, 是否新计算, 图片 Future 列表)
+
+        def settle(item: dict, result: FilterResult, fresh: bool, jobs: list) -> None:
+            if fresh:
+                decided = self.check_image_content(jobs, result) if jobs else True
+                if cache is not None and decided:
+                    cache.put(item, result)
+
+            verdict = self.tally(result, log)
+            if verdict == "blocked":
                 blocked.append(item)
-            elif result.needs_review:
-                self._stats["flagged"] += 1
+            elif verdict == "review":
                 review.append(item)
             else:
-                self._stats["passed"] += 1
                 safe.append(item)
 
-        # 保存审查日志
-        self._save_log(all_results)
+        for item, (result, fresh) in zip(items, self._iter_results(items, cache, workers)):
+            jobs = []
+            if fresh and checker is not None and not result.blocked:
+                jobs = checker.submit(item.get("images", []))
+            pending.append((item, result, fresh, jobs))
+            while len(pending) > window:
+                settle(*pending.popleft())
+        while pending:
+            settle(*pending.popleft())
 
-        return safe, review, blocked
+        # 登记本次审查摘要
+        log.close(self._stats.copy())
 
-    def _save_log(self, results: list[FilterResult]) -> None:
-        """保存审查日志"""
-        flagged = [r.to_dict() for r in results if r.blocked or r.needs_review]
-        if not flagged:
-            return
+        return safe, review, blocked
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_file = self.log_dir / f"filter_{timestamp}.json"
-        log_file.write_text(json.dumps({
-            "timestamp": timestamp,
-            "stats": self._stats.copy(),
-            "flagged_items": flagged,
-        }, ensure_ascii=False, indent=2))
-        logger.info(f"Filter log saved: {log_file}")
+    def tally(self, result: FilterResult, log: FilterLogWriter) -> str:
+        """计入统计并把命中结果写入日志，返回 "blocked" / "review" / "safe" """
+        self._stats["total"] += 1
+        if result.blocked or result.needs_review:
+            log.write(result.to_dict())
+        if result.blocked:
+            self._stats["blocked"] += 1
+            return "blocked"
+        if result.needs_review:
+            self._stats["flagged"] += 1
+            return "review"
+        self._stats["passed"] += 1
+        return "safe"
 
     def print_stats(self) -> None:
         """打印审查统计"""
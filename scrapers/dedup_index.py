@@ -0,0 +1,116 @@
+"""
+PromptVault Dedup Index — 持久化的去重索引
+按 prompt 指纹（见 fingerprint.py）和图片 URL 记录已收录的内容，作为 prompt store
+的 sidecar 文件，采集脚本启动时只需读取索引（O(索引大小)），不再解析全部 prompt 正文。
+
+文件格式（data/prompts.segments/dedup.idx，追加写入）:
+    #dedup v2 <generation>
+    h<TAB><128-bit digest><TAB><规范化长度><TAB><id>
+    i<TAB><image_url><TAB><id>
+
+generation 与 store manifest 中的值一致；prompts.json 被外部修改导致 manifest
+重建时 generation 变化，索引随之从语料重建一次。
+"""
+
+import logging
+from pathlib import Path
+from typing import Iterable, Optional
+
+from fingerprint import Fingerprint, fingerprint, record_fingerprint, record_images
+
+logger = logging.getLogger("dedup_index")
+
+INDEX_VERSION = 2
+
+
+class DedupIndex:
+    """指纹 / 图片 URL → 记录 id，增量追加到磁盘"""
+
+    def __init__(self, path: str | Path, generation: int = 0):
+        self.path = Path(path)
+        self.generation = generation
+        self.hashes: dict[str, tuple[int, str]] = {}
+        self.images: dict[str, str] = {}
+
+    def _header(self) -> str:
+        return f"#dedup v{INDEX_VERSION} {self.generation}\n"
+
+    def load(self) -> bool:
+        """读取索引文件，版本或 generation 不匹配时返回 False（需要重建）"""
+        if not self.path.exists():
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            if f.readline() != self._header():
+                return False
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if parts[0] == "h" and len(parts) == 4:
+                    self.hashes[parts[1]] = (int(parts[2]), parts[3])
+                elif parts[0] == "i" and len(parts) == 3:
+                    self.images[parts[1]] = parts[2]
+        return True
+
+    def rebuild(self, records: Iterable[dict]) -> None:
+        """从完整语料重建索引文件"""
+        self.hashes.clear()
+        self.images.clear()
+        self.path.write_text(self._header())
+        self.add(records)
+
+    def _keys(self, record: dict) -> list[str]:
+        lines = []
+        record_id = str(record.get("id") or "")
+        fp = record_fingerprint(record)
+        if fp and fp.digest not in self.hashes:
+            self.hashes[fp.digest] = (fp.length, record_id)
+            lines.append(f"h\t{fp.digest}\t{fp.length}\t{record_id}\n")
+        for img in record_images(record):
+            if img not in self.images:
+                self.images[img] = record_id
+                lines.append(f"i\t{img}\t{record_id}\n")
+        return lines
+
+    def add(self, records: Iterable[dict]) -> None:
+        """把新记录的指纹 / 图片追加到索引"""
+        lines = []
+        for record in records:
+            lines.extend(self._keys(record))
+        if lines:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    def find_fingerprint(self, fp: Fingerprint) -> Optional[str]:
+        """按指纹查找已收录记录的 id；digest 相同但长度不同视为碰撞，不算重复"""
+        entry = self.hashes.get(fp.digest)
+        if entry is None:
+            return None
+        length, record_id = entry
+        if length != fp.length:
+            logger.warning(f"Fingerprint collision on {fp.digest}: len {fp.length} vs {length}")
+            return None
+        return record_id
+
+    def find_text(self, text: str) -> Optional[str]:
+        return self.find_fingerprint(fingerprint(text)) if text else None
+
+    def find_image(self, url: str) -> Optional[str]:
+        return self.images.get(url) if url else None
+
+    def find(self, record) -> Optional[str]:
+        """记录的文本或任一图片已收录时返回对应 id，否则 None"""
+        fp = record_fingerprint(record)
+        if fp:
+            found = self.find_fingerprint(fp)
+            if found is not None:
+                return found
+        for img in record_images(record):
+            found = self.images.get(img)
+            if found is not None:
+                return found
+        return None
+
+    def contains(self, record) -> bool:
+        return self.find(record) is not None
+
+    def __len__(self) -> int:
+        return len(self.hashes)
@@ -0,0 +1,124 @@
+"""
+PromptVault Filter Log — 流式审查日志
+每条被拦截 / 标记的结果一经判定就追加一行 JSONL，内存占用与审查规模无关，
+审核工具可以直接 `tail -f` 日志文件。单个文件超过大小上限后自动轮转，
+每次审查结束时在 index.json 中登记本次的文件列表和统计。
+
+文件结构:
+    scrapers/output/filter_logs/
+        filter_20260301_163902_4182-1.jsonl     # 一行一个 FilterResult.to_dict()（时间_pid-序号）
+        filter_20260301_163902_4182-1_1.jsonl   # 超过 max_bytes 后的轮转文件
+        index.json                              # 每次审查的摘要（最近 200 次）
+
+同一秒内启动的多次审查（多个进程或同一进程内）各自使用独立的文件名；
+index.json 的读-改-写由 index.json.lock 串行化。
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger("content_filter")
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+INDEX_KEEP_RUNS = 200
+INDEX_LOCK_TIMEOUT = 10.0   # 等待 index.json.lock 的最长时间（秒）
+INDEX_LOCK_STALE = 60.0     # 超过该时间的锁文件视为崩溃残留
+
+_writer_ids = itertools.count(1)
+
+
+class FilterLogWriter:
+    """一次审查对应一个 writer；没有命中时不创建任何文件"""
+
+    def __init__(self, log_dir: str | Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.log_dir = Path(log_dir)
+        self.max_bytes = max_bytes
+        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # 同一秒内的多次审查靠 pid + 进程内序号区分，互不追加到对方的文件
+        self.run_id = f"{self.timestamp}_{os.getpid()}-{next(_writer_ids)}"
+        self.files: list[str] = []
+        self.written = 0
+        self._fh = None
+
+    def _open_next(self) -> None:
+        if self._fh:
+            self._fh.close()
+        suffix = f"_{len(self.files)}" if self.files else ""
+        name = f"filter_{self.run_id}{suffix}.jsonl"
+        self.files.append(name)
+        self._fh = open(self.log_dir / name, "x", encoding="utf-8")
+
+    def write(self, record: dict) -> None:
+        """追加一条审查结果并立即 flush"""
+        if self._fh is None or self._fh.tell() >= self.max_bytes:
+            self._open_next()
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        self.written += 1
+
+    def close(self, stats: dict) -> None:
+        """关闭当前文件，并在 index.json 中登记本次审查"""
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+        if not self.files:
+            return
+
+        index_file = self.log_dir / "index.json"
+        with _IndexLock(self.log_dir / "index.json.lock"):
+            runs = []
+            if index_file.exists():
+                try:
+                    runs = json.loads(index_file.read_text()).get("runs", [])
+                except json.JSONDecodeError:
+                    runs = []
+            runs.append({
+                "timestamp": self.timestamp,
+                "run_id": self.run_id,
+                "finished": datetime.now().strftime("%Y%m%d_%H%M%S"),
+                "stats": stats,
+                "flagged_items": self.written,
+                "files": self.files,
+            })
+            tmp = index_file.with_name(f"index.json.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"runs": runs[-INDEX_KEEP_RUNS:]}, ensure_ascii=False, indent=2))
+            os.replace(tmp, index_file)
+        logger.info(f"Filter log saved: {', '.join(self.files)}")
+
+
+class _IndexLock:
+    """index.json 的跨进程锁：O_EXCL 创建锁文件，超时或锁文件过旧时不再等待"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.held = False
+
+    def __enter__(self) -> "_IndexLock":
+        deadline = time.monotonic() + INDEX_LOCK_TIMEOUT
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                self.held = True
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - self.path.stat().st_mtime > INDEX_LOCK_STALE:
+                        self.path.unlink()
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() >= deadline:
+                    logger.warning(f"{self.path} still held after {INDEX_LOCK_TIMEOUT:.0f}s, updating index anyway")
+                    return self
+                time.sleep(0.05)
+
+    def __exit__(self, *exc) -> None:
+        if self.held:
+            self.path.unlink(missing_ok=True)
+            self.held = False
@@ -0,0 +1,64 @@
+"""
+PromptVault Fingerprint — 统一的 prompt 去重指纹
+所有采集 / 合并脚本（collect.py、batch_collect.py、playwriter_*、merge_*.py）
+都通过这里计算去重 key，不再各自维护 md5[:12] / 前 100 字符等不同定义。
+
+规范化规则: NFKC（全角半角统一）→ 小写 → 合并连续空白
+指纹: 规范化文本的完整 128-bit md5 + 规范化长度（用于碰撞校验）
+
+使用方式:
+    from fingerprint import fingerprint, record_fingerprint
+    fp = fingerprint(prompt_text)
+    fp.digest   # 32 位 hex，写入 dedup 索引
+    fp.short    # 前 12 位，兼容旧的 content_hash / ID 格式
+"""
+
+import hashlib
+import unicodedata
+from typing import NamedTuple, Optional
+
+
+class Fingerprint(NamedTuple):
+    digest: str   # 完整 md5 hex（128-bit）
+    length: int   # 规范化后的文本长度
+
+    @property
+    def short(self) -> str:
+        """12 位短 hash，兼容旧的 content_hash 和基于 hash 的 ID"""
+        return self.digest[:12]
+
+
+def normalize_text(text: str) -> str:
+    """去重用的规范化文本"""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.lower().split())
+
+
+def fingerprint(text: str) -> Fingerprint:
+    """计算 prompt 文本的指纹"""
+    normalized = normalize_text(text)
+    return Fingerprint(hashlib.md5(normalized.encode()).hexdigest(), len(normalized))
+
+
+def record_text(record) -> str:
+    """记录的 prompt 文本（PromptItem 或 dict，兼容旧数据的 content 字段）"""
+    if not isinstance(record, dict):
+        return record.prompt
+    return record.get("prompt") or record.get("content") or ""
+
+
+def record_images(record) -> list[str]:
+    """记录中的全部图片 URL（兼容旧数据的 imageUrl / image 字段）"""
+    if not isinstance(record, dict):
+        return [img for img in record.images if img]
+    images = [img for img in record.get("images") or [] if img]
+    for legacy in ("imageUrl", "image"):
+        if isinstance(record.get(legacy), str) and record[legacy]:
+            images.append(record[legacy])
+    return images
+
+
+def record_fingerprint(record) -> Optional[Fingerprint]:
+    """记录的指纹，没有 prompt 文本时返回 None"""
+    text = record_text(record)
+    return fingerprint(text) if text else None
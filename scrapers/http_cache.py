@@ -0,0 +1,207 @@
+"""
+PromptVault HTTP Cache — 磁盘上的条件请求缓存
+同一组 Civitai sort / period 查询每天甚至每小时都会重跑，返回的往往是同一份数据。
+这里按 URL 保存响应的 ETag / Last-Modified，下次请求带上 If-None-Match /
+If-Modified-Since，服务端返回 304 时直接用本地副本；响应体按 sha256 内容寻址存储，
+即使服务端不支持条件请求，也能通过 digest 判断页面是否变化。
+
+目录结构:
+    scrapers/output/http_cache/
+        entries/<url key>.json    # url、etag、last_modified、digest、stored_at、last_used
+        bodies/<sha256>           # 响应体（多个 URL 内容相同时共享）
+
+- ttl 秒内的条目直接使用，不发请求；超过 ttl 发条件请求重新验证
+- 超过 max_age 未使用的条目、以及总大小超过 max_bytes 时最久未使用的条目会被淘汰
+
+使用方式（通过 HttpClient）:
+    resp = http.get(url, cache_ttl=0)     # 0 = 每次都条件请求
+    resp.json()                           # 304 时为本地副本；省掉的是下载，不代表已入库
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_DIR = "scrapers/output/http_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 14 * 24 * 3600
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class CacheEntry:
+    """一个 URL 的缓存元数据"""
+
+    def __init__(self, data: dict):
+        self.url: str = data["url"]
+        self.digest: str = data["digest"]
+        self.etag: Optional[str] = data.get("etag")
+        self.last_modified: Optional[str] = data.get("last_modified")
+        self.content_type: str = data.get("content_type", "")
+        self.stored_at: float = data.get("stored_at", 0.0)
+        self.last_used: float = data.get("last_used", self.stored_at)
+        self.size: int = data.get("size", 0)
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url, "digest": self.digest, "etag": self.etag,
+            "last_modified": self.last_modified, "content_type": self.content_type,
+            "stored_at": self.stored_at, "last_used": self.last_used, "size": self.size,
+        }
+
+    def validators(self) -> dict:
+        """条件请求头"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """按 URL 索引、按内容 digest 存储响应体的磁盘缓存"""
+
+    def __init__(
+        self,
+        cache_dir: str | Path = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age: float = DEFAULT_MAX_AGE,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.entries_dir = self.cache_dir / "entries"
+        self.bodies_dir = self.cache_dir / "bodies"
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self.stats = {"fresh": 0, "revalidated": 0, "unchanged": 0, "stored": 0, "evicted": 0}
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+    def _entry_path(self, url: str) -> Path:
+        return self.entries_dir / f"{self.key(url)}.json"
+
+    # ---------- 读取 ----------
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        path = self._entry_path(url)
+        try:
+            entry = CacheEntry(json.loads(path.read_text()))
+        except (OSError, ValueError, KeyError):
+            return None
+        if entry.url != url or not (self.bodies_dir / entry.digest).exists():
+            return None
+        return entry
+
+    def is_fresh(self, entry: CacheEntry, ttl: float) -> bool:
+        return ttl > 0 and time.time() - entry.stored_at < ttl
+
+    def body(self, entry: CacheEntry) -> bytes:
+        return (self.bodies_dir / entry.digest).read_bytes()
+
+    def touch(self, entry: CacheEntry, revalidated: bool = False) -> None:
+        """命中后更新使用时间；revalidated=True 表示服务端确认未变化（304），重置 ttl"""
+        now = time.time()
+        entry.last_used = now
+        if revalidated:
+            entry.stored_at = now
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self._entry_path(entry.url), json.dumps(entry.to_dict()).encode())
+
+    # ---------- 写入 ----------
+
+    def store(self, url: str, body: bytes, headers) -> tuple[CacheEntry, bool]:
+        """保存 200 响应，返回 (新条目, 内容是否与上次相同)"""
+        previous = self.lookup(url)
+        digest = hashlib.sha256(body).hexdigest()
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        self.bodies_dir.mkdir(parents=True, exist_ok=True)
+
+        body_path = self.bodies_dir / digest
+        if not body_path.exists():
+            _write_atomic(body_path, body)
+            with self._lock:
+                if self._total_bytes is not None:
+                    self._total_bytes += len(body)
+
+        now = time.time()
+        entry = CacheEntry({
+            "url": url,
+            "digest": digest,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_type": headers.get("Content-Type", ""),
+            "stored_at": now,
+            "last_used": now,
+            "size": len(body),
+        })
+        _write_atomic(self._entry_path(url), json.dumps(entry.to_dict()).encode())
+        with self._lock:
+            self.stats["stored"] += 1
+        if self._over_budget():
+            self.prune()
+        return entry, previous is not None and previous.digest == digest
+
+    # ---------- 淘汰 ----------
+
+    def _over_budget(self) -> bool:
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(
+                    e.stat().st_size for e in os.scandir(self.bodies_dir) if e.is_file()
+                ) if self.bodies_dir.exists() else 0
+            return self._total_bytes > self.max_bytes
+
+    def prune(self) -> int:
+        """淘汰过期条目；总大小仍超出 max_bytes 时按最久未使用淘汰。返回淘汰的条目数"""
+        if not self.entries_dir.exists():
+            return 0
+        now = time.time()
+        entries: list[tuple[Path, CacheEntry]] = []
+        removed = 0
+        for path in self.entries_dir.glob("*.json"):
+            try:
+                entry = CacheEntry(json.loads(path.read_text()))
+            except (OSError, ValueError, KeyError):
+                path.unlink(missing_ok=True)
+                continue
+            if now - entry.last_used > self.max_age:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((path, entry))
+
+        entries.sort(key=lambda pe: pe[1].last_used)
+        sizes = {e.digest: e.size for _, e in entries}
+        total = sum(sizes.values())
+        while entries and total > self.max_bytes:
+            path, entry = entries.pop(0)
+            path.unlink(missing_ok=True)
+            removed += 1
+            if all(e.digest != entry.digest for _, e in entries):
+                total -= sizes.pop(entry.digest, 0)
+
+        # 删除不再被任何条目引用的响应体
+        live = {e.digest for _, e in entries}
+        total = 0
+        if self.bodies_dir.exists():
+            for body in os.scandir(self.bodies_dir):
+                if body.name in live:
+                    total += body.stat().st_size
+                elif not body.name.endswith(".tmp"):
+                    os.unlink(body.path)
+        with self._lock:
+            self._total_bytes = total
+            self.stats["evicted"] += removed
+        return removed
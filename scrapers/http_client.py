@@ -0,0 +1,351 @@
+"""
+PromptVault HTTP Client — 带连接池的共享 HTTP 客户端
+所有 adapter / 脚本通过同一个客户端发请求：按 (scheme, host, port) 维护 keep-alive
+连接池，多页抓取复用 TCP + TLS 连接，不再每次请求重新握手。
+
+- 自动发送 Accept-Encoding 并解码 gzip / deflate（安装 brotli 时也支持 br）
+- 跟随 301 / 302 / 303 / 307 / 308 重定向
+- 状态码 >= 400 抛出 HttpError（与 urllib 的 HTTPError 一样可被 `except Exception` 捕获）
+- 线程安全：连接按请求借出、读完响应后归还
+- 传入 cache_ttl 的 GET 走磁盘条件请求缓存（http_cache.py），resp.not_modified
+  表示内容与上次（任意脚本）抓取时相同，只说明省掉了下载，不代表内容已入库
+- 请求前按 host 取令牌（rate_limit.py）；429 / 5xx 按 Retry-After 或指数退避后重试
+- 与 urlopen 一样遵循 HTTP_PROXY / HTTPS_PROXY / NO_PROXY（urllib.request.getproxies()）：
+  https 经 CONNECT 隧道，http 向代理发送绝对 URL；支持 user:pass@ 形式的 Basic 认证，
+  不支持 SOCKS 代理
+
+使用方式:
+    from http_client import default_client
+    http = default_client()
+    data = http.get_json("https://civitai.com/api/v1/images?limit=100")
+    html = http.get("https://prompthero.com/prompts", timeout=30).text()
+    resp = http.get(url, cache_ttl=0)    # 条件请求，304 时使用本地副本
+"""
+
+import base64
+import gzip
+import http.client
+import json
+import threading
+import urllib.request
+import zlib
+from typing import Optional
+from urllib.parse import unquote, urljoin, urlsplit
+
+from http_cache import CacheEntry, HttpCache
+from rate_limit import RETRY_STATUSES, RateLimiter, parse_retry_after
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，缺失时不声明 br
+    brotli = None
+
+DEFAULT_USER_AGENT = "PromptVault/1.0"
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 5
+MAX_RETRIES = 4
+
+_REDIRECT_CODES = {301, 302, 303, 307, 308}
+# 复用的空闲连接可能已被服务端关闭，遇到这些异常时换新连接重试一次
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                 BrokenPipeError, ConnectionResetError)
+
+
+class HttpError(Exception):
+    """HTTP 状态码 >= 400"""
+
+    def __init__(self, status: int, url: str, response: "HttpResponse"):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+        self.response = response
+
+
+class HttpResponse:
+    """已读完并解码的响应"""
+
+    def __init__(self, url: str, status: int, headers: http.client.HTTPMessage, body: bytes):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.from_cache = False     # 响应体来自本地缓存（ttl 内或 304）
+        self.not_modified = False   # 内容与上次缓存的相同
+
+    @classmethod
+    def from_cache_entry(cls, entry: CacheEntry, body: bytes) -> "HttpResponse":
+        headers = http.client.HTTPMessage()
+        if entry.content_type:
+            headers["Content-Type"] = entry.content_type
+        resp = cls(entry.url, 200, headers, body)
+        resp.from_cache = resp.not_modified = True
+        return resp
+
+    def text(self, encoding: str = "utf-8", errors: str = "ignore") -> str:
+        return self.body.decode(encoding, errors=errors)
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def _decode(body: bytes, encoding: str) -> bytes:
+    encoding = encoding.strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:  # 部分服务端发送不带 zlib 头的 raw deflate
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    if encoding == "br" and brotli is not None:
+        return brotli.decompress(body)
+    return body
+
+
+class HttpClient:
+    """按 host 维护 keep-alive 连接池的 HTTP 客户端"""
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_idle_per_host: int = 4,
+        user_agent: str = DEFAULT_USER_AGENT,
+        cache: Optional[HttpCache] = None,
+        limiter: Optional[RateLimiter] = None,
+        max_retries: int = MAX_RETRIES,
+        proxies: Optional[dict[str, str]] = None,
+    ):
+        self.timeout = timeout
+        # scheme → 代理 URL（含 "no" 排除列表），None 时按环境变量 / 系统设置
+        self._system_proxies = proxies is None
+        self.proxies = urllib.request.getproxies() if proxies is None else proxies
+        self.cache = cache
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.max_idle_per_host = max_idle_per_host
+        self.user_agent = user_agent
+        self.accept_encoding = "gzip, deflate, br" if brotli is not None else "gzip, deflate"
+        self._idle: dict[tuple[str, str, int], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "connections": 0, "reused": 0, "retries": 0}
+
+    # ---------- 代理 ----------
+
+    def _proxy_for(self, scheme: str, host: str) -> Optional[tuple[str, int, dict]]:
+        """目标 host 使用的代理 (host, port, 代理认证头)；直连时返回 None"""
+        proxy = self.proxies.get(scheme)
+        if not proxy:
+            return None
+        bypass = (urllib.request.proxy_bypass(host) if self._system_proxies
+                  else urllib.request.proxy_bypass_environment(host, self.proxies))
+        if bypass:
+            return None
+        parts = urlsplit(proxy if "://" in proxy else "http://" + proxy)
+        headers = {}
+        if parts.username:
+            credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+            headers["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode()
+        return parts.hostname or "", parts.port or 80, headers
+
+    # ---------- 连接池 ----------
+
+    def _checkout(
+        self, key: tuple[str, str, int], timeout: float, proxy: Optional[tuple[str, int, dict]] = None,
+    ) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                conn = idle.pop()
+                self.stats["reused"] += 1
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            self.stats["connections"] += 1
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        if proxy is None:
+            return cls(host, port, timeout=timeout), False
+        proxy_host, proxy_port, proxy_headers = proxy
+        conn = cls(proxy_host, proxy_port, timeout=timeout)
+        if scheme == "https":
+            conn.set_tunnel(host, port, headers=proxy_headers)
+        return conn, False
+
+    def _checkin(self, key: tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        """关闭所有空闲连接"""
+        with self._lock:
+            pools, self._idle = self._idle, {}
+        for idle in pools.values():
+            for conn in idle:
+                conn.close()
+
+    # ---------- 请求 ----------
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        headers: dict,
+        body: Optional[bytes],
+        timeout: float,
+        max_bytes: Optional[int],
+    ) -> HttpResponse:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {url}")
+        key = (scheme, parts.hostname or "", parts.port or (443 if scheme == "https" else 80))
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        proxy = self._proxy_for(scheme, key[1])
+        if proxy is not None and scheme == "http":
+            # 明文 HTTP 经代理转发：请求行使用绝对 URL，认证头随每个请求发送
+            path = url.split("#", 1)[0]
+            headers = {**headers, **proxy[2]}
+
+        for attempt in range(2):
+            conn, reused = self._checkout(key, timeout, proxy)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read() if max_bytes is None else resp.read(max_bytes + 1)
+            except _STALE_ERRORS:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            # 读满 max_bytes 时响应可能未读完，连接不能复用
+            if resp.will_close or not resp.isclosed():
+                conn.close()
+            else:
+                self._checkin(key, conn)
+            break
+
+        body_bytes = _decode(raw, resp.headers.get("Content-Encoding", ""))
+        return HttpResponse(url, resp.status, resp.headers, body_bytes)
+
+    def _send_limited(
+        self,
+        method: str,
+        url: str,
+        headers: dict,
+        body: Optional[bytes],
+        timeout: float,
+        max_bytes: Optional[int],
+    ) -> HttpResponse:
+        """按 host 限速发送；429（任意方法）和 5xx（GET / HEAD）退避后重试"""
+        host = urlsplit(url).hostname or ""
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire(host)
+            with self._lock:
+                self.stats["requests"] += 1
+            resp = self._send(method, url, headers, body, timeout, max_bytes)
+            retryable = resp.status == 429 or (resp.status in RETRY_STATUSES and method in ("GET", "HEAD"))
+            if self.limiter is None:
+                break
+            if not retryable:
+                self.limiter.on_success(host)
+                break
+            # 最后一次失败也要暂停该 host，避免其他线程继续撞限流
+            self.limiter.on_throttle(host, attempt, parse_retry_after(resp.headers.get("Retry-After")))
+            if attempt == self.max_retries:
+                break
+            with self._lock:
+                self.stats["retries"] += 1
+        return resp
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[dict] = None,
+        body: Optional[bytes] = None,
+        timeout: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        raise_for_status: bool = True,
+        cache_ttl: Optional[float] = None,
+    ) -> HttpResponse:
+        """
+        发送请求并读完响应；max_bytes 限制读取的（压缩前）字节数。
+        cache_ttl 不为 None 的 GET 使用磁盘缓存：ttl 秒内直接返回本地副本，
+        之后发条件请求，304 时同样返回本地副本。
+        """
+        merged = {"User-Agent": self.user_agent, "Accept-Encoding": self.accept_encoding}
+        merged.update(headers or {})
+        timeout = self.timeout if timeout is None else timeout
+
+        cache = self.cache if cache_ttl is not None and method == "GET" else None
+        requested_url = url
+        entry = cache.lookup(url) if cache is not None else None
+        if entry is not None:
+            if cache.is_fresh(entry, cache_ttl):
+                cache.touch(entry)
+                cache.stats["fresh"] += 1
+                return HttpResponse.from_cache_entry(entry, cache.body(entry))
+            merged.update(entry.validators())
+
+        for _ in range(MAX_REDIRECTS + 1):
+            resp = self._send_limited(method, url, merged, body, timeout, max_bytes)
+            location = resp.headers.get("Location")
+            if resp.status not in _REDIRECT_CODES or not location:
+                break
+            url = urljoin(url, location)
+            if resp.status == 303 or (resp.status in (301, 302) and method == "POST"):
+                method, body = "GET", None
+                merged.pop("Content-Type", None)
+        else:
+            raise HttpError(resp.status, url, resp)
+
+        if cache is not None:
+            if resp.status == 304 and entry is not None:
+                cache.touch(entry, revalidated=True)
+                cache.stats["revalidated"] += 1
+                return HttpResponse.from_cache_entry(entry, cache.body(entry))
+            if resp.status == 200:
+                _, unchanged = cache.store(requested_url, resp.body, resp.headers)
+                if unchanged:
+                    resp.not_modified = True
+                    cache.stats["unchanged"] += 1
+
+        if raise_for_status and resp.status >= 400:
+            raise HttpError(resp.status, url, resp)
+        return resp
+
+    def get(self, url: str, headers: Optional[dict] = None, **kwargs) -> HttpResponse:
+        return self.request("GET", url, headers=headers, **kwargs)
+
+    def get_json(self, url: str, headers: Optional[dict] = None, **kwargs):
+        headers = {"Accept": "application/json", **(headers or {})}
+        return self.get(url, headers=headers, **kwargs).json()
+
+    def post_json(self, url: str, payload, headers: Optional[dict] = None, **kwargs):
+        headers = {"Accept": "application/json", "Content-Type": "application/json", **(headers or {})}
+        body = json.dumps(payload).encode()
+        return self.request("POST", url, headers=headers, body=body, **kwargs).json()
+
+
+_default_client: Optional[HttpClient] = None
+_default_lock = threading.Lock()
+
+
+def default_client() -> HttpClient:
+    """进程内共享的客户端（所有 adapter 共用同一组连接池）"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient(cache=HttpCache(), limiter=RateLimiter())
+        return _default_client
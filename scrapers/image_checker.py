@@ -0,0 +1,241 @@
+"""
+PromptVault Image Checker — 图片内容检测（ContentFilter 第三层防线）
+在线程池中批量下载 / 读取图片（远程 URL 或仓库内 images/ 文件），解码后交给可替换的
+打分后端。与文本审查异步并行：filter_items 开始时先提交全部图片，文本检测结束后再取结果。
+
+- 分数按图片内容 digest（sha256）缓存，URL → digest 映射也持久化，
+  同一张图片不会重复下载或重复打分；label 在读取时按当前阈值计算，调整阈值不会复用旧判定
+- 后端只需实现 score(data) -> Optional[float]（0~1，越高越可疑）；无法打分（None）的结果不缓存
+- 默认的 SkinToneBackend 是本地启发式（肤色像素占比），依赖 Pillow；
+  未安装 Pillow 时所有图片判定为 unknown，不影响文本审查
+
+使用方式:
+    from image_checker import ImageChecker
+    checker = ImageChecker(workers=8)
+    cf = ContentFilter(image_checker=checker)
+    cf.filter_items(items)
+    checker.close()            # 写回缓存
+    print(checker.stats())     # 吞吐统计
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from http_client import default_client
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 为可选依赖
+    Image = None
+
+REPO_ROOT = Path(__file__).parent.parent
+
+# 单张图片下载上限，超过视为失败
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+# 缓存文件格式：v2 起 verdicts 只保存分数（digest → score）
+CACHE_VERSION = 2
+
+
+class ImageVerdict:
+    """单张图片的检测结果"""
+
+    def __init__(self, url: str, label: str, score: Optional[float] = None,
+                 backend: str = "", digest: str = ""):
+        self.url = url
+        self.label = label          # safe / review / block / unknown
+        self.score = score
+        self.backend = backend
+        self.digest = digest
+
+
+class ImageBackend(ABC):
+    """打分后端基类"""
+
+    name = "base"
+
+    @abstractmethod
+    def score(self, data: bytes) -> Optional[float]:
+        """返回 0~1 的可疑度；无法判断时返回 None"""
+        ...
+
+
+class SkinToneBackend(ImageBackend):
+    """本地启发式：缩略图中肤色像素（YCbCr 范围）的占比"""
+
+    name = "skin-tone-v1"
+
+    def score(self, data: bytes) -> Optional[float]:
+        if Image is None:
+            return None
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft("RGB", (128, 128))
+            small = img.convert("YCbCr").resize((64, 64))
+        pixels = list(small.getdata())
+        skin = sum(1 for _, cb, cr in pixels if 77 <= cb <= 127 and 133 <= cr <= 173)
+        return skin / len(pixels) if pixels else None
+
+
+class ImageChecker:
+    """图片检测阶段：线程池解码打分 + digest 缓存 + 吞吐统计"""
+
+    def __init__(
+        self,
+        backend: Optional[ImageBackend] = None,
+        workers: int = 4,
+        cache_path: str | Path = "scrapers/output/image_verdicts.json",
+        review_threshold: float = 0.45,
+        block_threshold: float = 0.75,
+        timeout: int = 15,
+    ):
+        self.backend = backend or SkinToneBackend()
+        self.review_threshold = review_threshold
+        self.block_threshold = block_threshold
+        self.timeout = timeout
+        self.cache_path = Path(cache_path)
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-check")
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Future] = {}
+        self._url_digest: dict[str, str] = {}
+        self._scores: dict[str, float] = {}  # digest → score
+        self._counters = {
+            "submitted": 0, "completed": 0, "cache_hits": 0,
+            "downloaded": 0, "bytes": 0, "errors": 0, "busy_seconds": 0.0,
+        }
+        self._started: Optional[float] = None
+        self._load_cache()
+
+    @property
+    def fingerprint(self) -> str:
+        """后端名 + 阈值，传给 ruleset_fingerprint：任一变化都使审查缓存失效"""
+        return f"{self.backend.name}@{self.review_threshold}/{self.block_threshold}"
+
+    # ---------- 缓存 ----------
+
+    def _load_cache(self) -> None:
+        if not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text())
+        except json.JSONDecodeError:
+            return
+        if data.get("backend") != self.backend.name or data.get("version") != CACHE_VERSION:
+            return
+        self._url_digest = data.get("urls", {})
+        self._scores = data.get("scores", {})
+
+    def close(self) -> None:
+        """等待进行中的任务并写回缓存"""
+        self._pool.shutdown(wait=True)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        with self._lock:
+            payload = {"version": CACHE_VERSION, "backend": self.backend.name,
+                       "urls": self._url_digest, "scores": self._scores}
+            tmp.write_text(json.dumps(payload, ensure_ascii=False))
+        os.replace(tmp, self.cache_path)
+
+    # ---------- 检测 ----------
+
+    def _label(self, score: Optional[float]) -> str:
+        if score is None:
+            return "unknown"
+        if score >= self.block_threshold:
+            return "block"
+        if score >= self.review_threshold:
+            return "review"
+        return "safe"
+
+    def _read(self, url: str) -> bytes:
+        if url.startswith(("http://", "https://")):
+            data = default_client().get(url, timeout=self.timeout, max_bytes=MAX_IMAGE_BYTES).body
+        else:
+            data = (REPO_ROOT / url.lstrip("/")).read_bytes()
+        if len(data) > MAX_IMAGE_BYTES:
+            raise ValueError(f"image larger than {MAX_IMAGE_BYTES} bytes")
+        return data
+
+    def _check(self, url: str) -> ImageVerdict:
+        t0 = time.monotonic()
+        try:
+            data = self._read(url)
+            digest = hashlib.sha256(data).hexdigest()
+            with self._lock:
+                self._counters["downloaded"] += 1
+                self._counters["bytes"] += len(data)
+                self._url_digest[url] = digest
+                score = self._scores.get(digest)
+            if score is not None:
+                with self._lock:
+                    self._counters["cache_hits"] += 1
+                return ImageVerdict(url, self._label(score), score, self.backend.name, digest)
+
+            score = self.backend.score(data)
+            if score is not None:
+                with self._lock:
+                    self._scores[digest] = score
+            return ImageVerdict(url, self._label(score), score, self.backend.name, digest)
+        except Exception:
+            with self._lock:
+                self._counters["errors"] += 1
+            return ImageVerdict(url, "unknown", None, self.backend.name)
+        finally:
+            with self._lock:
+                self._counters["completed"] += 1
+                self._counters["busy_seconds"] += time.monotonic() - t0
+
+    def _cached_future(self, url: str) -> Optional[Future]:
+        digest = self._url_digest.get(url)
+        score = self._scores.get(digest) if digest else None
+        if score is None:
+            return None
+        future: Future = Future()
+        future.set_result(ImageVerdict(url, self._label(score), score, self.backend.name, digest))
+        self._counters["cache_hits"] += 1
+        self._counters["completed"] += 1
+        return future
+
+    def submit(self, urls: list[str]) -> list[Future]:
+        """异步提交一批图片，返回对应的 Future[ImageVerdict]；已缓存或进行中的 URL 不会重复处理"""
+        futures, started = [], []
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic()
+            for url in urls:
+                if not url:
+                    continue
+                self._counters["submitted"] += 1
+                future = self._inflight.get(url) or self._cached_future(url)
+                if future is None:
+                    future = self._pool.submit(self._check, url)
+                    self._inflight[url] = future
+                    started.append((url, future))
+                futures.append(future)
+        # 锁外注册：已完成的 Future 会在当前线程立即回调
+        for url, future in started:
+            future.add_done_callback(lambda _, url=url: self._done(url))
+        return futures
+
+    def _done(self, url: str) -> None:
+        # 完成后结果已在 digest 缓存里（失败的下次重新下载），不再占用在途表
+        with self._lock:
+            self._inflight.pop(url, None)
+
+    def stats(self) -> dict:
+        """吞吐统计：提交 / 完成数、缓存命中、下载字节、每秒处理图片数"""
+        with self._lock:
+            s = dict(self._counters)
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        s["elapsed_seconds"] = round(elapsed, 3)
+        s["images_per_second"] = round(s["completed"] / elapsed, 2) if elapsed else 0.0
+        s["busy_seconds"] = round(s["busy_seconds"], 3)
+        return s
@@ -0,0 +1,73 @@
+"""
+PromptVault Keyword Automaton — Aho-Corasick 多模式匹配
+把一组关键词（中英文混合）编译成一个自动机，对文本单次扫描即可得到全部命中，
+耗时只与文本长度有关，与关键词数量无关。内容审查（content_filter.py）等模块共用。
+
+使用方式:
+    from keyword_automaton import KeywordAutomaton
+    ac = KeywordAutomaton(["nsfw", "裸体", "cp "])
+    ac.search("some nsfw text")          # → {0}（命中的关键词下标）
+"""
+
+from collections import deque
+from typing import Iterable
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 自动机，关键词按小写匹配（子串语义，与 `kw in text` 一致）"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = [kw.lower() for kw in keywords]
+        # goto[state] = {char: next_state}；fail[state] = 失配跳转；out[state] = 命中的关键词下标
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[int, ...]] = [()]
+        for idx, kw in enumerate(self.keywords):
+            if kw:
+                self._insert(kw, idx)
+        self._build_fail_links()
+
+    def _insert(self, kw: str, idx: int) -> None:
+        state = 0
+        for ch in kw:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][ch] = nxt
+            state = nxt
+        self._out[state] += (idx,)
+
+    def _build_fail_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> set[int]:
+        """单次扫描文本，返回全部命中关键词的下标（text 需已小写）"""
+        goto, fail, out = self._goto, self._fail, self._out
+        hits: set[int] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                hits.update(out[state])
+        return hits
+
+    def search_keywords(self, text: str) -> list[str]:
+        """返回命中的关键词（按编译时的顺序）"""
+        return [self.keywords[i] for i in sorted(self.search(text.lower()))]
+
+    def __len__(self) -> int:
+        return len(self.keywords)
@@ -0,0 +1,236 @@
+"""
+PromptVault Near-Duplicate Index — MinHash + LSH 近似去重
+精确指纹（fingerprint.py）只能识别完全相同的 prompt；Civitai 上最常见的重复是
+同一 prompt 改了 LoRA 权重、调换了 tag 顺序或追加了 negative prompt。
+这里把 prompt 规范化成 token 集合，计算 MinHash 签名，再按 band 分桶（LSH），
+查询时只比较同桶候选，复杂度与语料规模无关。
+
+文件格式（data/prompts.segments/near_dup.idx，追加写入）:
+    #neardup v1 <generation> <num_perm> <bands> <rows>
+    <id><TAB><签名 base64><TAB><band key 列表，逗号分隔>
+
+使用方式:
+    index = store.near_dup                 # 由 PromptStore 加载 / 重建
+    dup_id = index.query(item)             # 相似度 ≥ threshold 的已收录记录 id
+    unique = index.filter_new(items)       # 去掉与语料或批次内其他条目近似重复的条目
+"""
+
+import base64
+import hashlib
+import random
+import re
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
+
+from fingerprint import normalize_text, record_text
+
+INDEX_VERSION = 1
+
+DEFAULT_NUM_PERM = 128
+DEFAULT_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SEED = 20260301
+
+# <lora:name:0.8> / <lyco:name:1> → name；(word:1.2) → word
+_LORA_RE = re.compile(r"<(?:lora|lyco|hypernet):([^:>]+)(?::[^>]*)?>")
+_WEIGHT_RE = re.compile(r":\s*-?\d+(?:\.\d+)?")
+_TOKEN_RE = re.compile(r"[\w\-']+")
+
+
+def _permutations(num_perm: int) -> list[tuple[int, int]]:
+    rng = random.Random(_SEED)
+    return [
+        (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+        for _ in range(num_perm)
+    ]
+
+
+def shingles(text: str) -> set[str]:
+    """prompt → token 集合（去掉 negative prompt、LoRA / 括号权重，忽略顺序）"""
+    main = text.split("Negative prompt:", 1)[0]
+    main = normalize_text(main)
+    main = _LORA_RE.sub(r" \1 ", main)
+    main = _WEIGHT_RE.sub(" ", main)
+    return set(_TOKEN_RE.findall(main))
+
+
+def optimal_bands(threshold: float, num_perm: int) -> tuple[int, int]:
+    """选择 (bands, rows)，使 S 曲线拐点 (1/b)^(1/r) 最接近 threshold"""
+    best = (num_perm, 1)
+    best_err = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if bands < 1:
+            break
+        err = abs((1 / bands) ** (1 / rows) - threshold)
+        if err < best_err:
+            best, best_err = (bands, rows), err
+    return best
+
+
+class NearDupIndex:
+    """MinHash 签名 + LSH band 表；path 为 None 时只在内存中使用"""
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        generation: int = 0,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = DEFAULT_NUM_PERM,
+    ):
+        self.path = Path(path) if path else None
+        self.generation = generation
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        self._perms = _permutations(num_perm)
+        self._token_hash = lru_cache(maxsize=200_000)(self._token_hash_uncached)
+        self.signatures: dict[str, tuple[int, ...]] = {}
+        self.buckets: dict[str, list[str]] = {}
+
+    # ---------- MinHash ----------
+
+    def _token_hash_uncached(self, token: str) -> tuple[int, ...]:
+        x = int.from_bytes(hashlib.md5(token.encode()).digest()[:8], "little")
+        return tuple(((a * x + b) % _MERSENNE_PRIME) & _MAX_HASH for a, b in self._perms)
+
+    def signature(self, text: str) -> Optional[tuple[int, ...]]:
+        """prompt 的 MinHash 签名，没有有效 token 时返回 None"""
+        tokens = shingles(text)
+        if not tokens:
+            return None
+        return tuple(map(min, zip(*(self._token_hash(t) for t in tokens))))
+
+    def band_keys(self, sig: tuple[int, ...]) -> list[str]:
+        keys = []
+        for b in range(self.bands):
+            chunk = struct.pack(f"<{self.rows}I", *sig[b * self.rows:(b + 1) * self.rows])
+            keys.append(f"{b}:{hashlib.md5(chunk).hexdigest()[:12]}")
+        return keys
+
+    @staticmethod
+    def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+        """两个签名的估计 Jaccard 相似度"""
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+    # ---------- 持久化 ----------
+
+    def _header(self) -> str:
+        return (f"#neardup v{INDEX_VERSION} {self.generation} "
+                f"{self.num_perm} {self.bands} {self.rows}\n")
+
+    def load(self) -> bool:
+        """读取索引文件，版本 / generation / band 参数不匹配时返回 False（需要重建）"""
+        if not self.path or not self.path.exists():
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            if f.readline() != self._header():
+                return False
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 3:
+                    continue
+                record_id, sig_b64, keys = parts
+                raw = base64.b64decode(sig_b64)
+                self.signatures[record_id] = struct.unpack(f"<{self.num_perm}I", raw)
+                for key in keys.split(","):
+                    self.buckets.setdefault(key, []).append(record_id)
+        return True
+
+    def rebuild(self, records: Iterable[dict]) -> None:
+        """从完整语料重建索引"""
+        self.signatures.clear()
+        self.buckets.clear()
+        if self.path:
+            self.path.write_text(self._header())
+        self.add(records)
+
+    def _insert(self, record_id: str, sig: tuple[int, ...]) -> list[str]:
+        keys = self.band_keys(sig)
+        self.signatures[record_id] = sig
+        for key in keys:
+            self.buckets.setdefault(key, []).append(record_id)
+        return keys
+
+    def _line(self, record_id: str, sig: tuple[int, ...], keys: list[str]) -> str:
+        sig_b64 = base64.b64encode(struct.pack(f"<{self.num_perm}I", *sig)).decode()
+        return f"{record_id}\t{sig_b64}\t{','.join(keys)}\n"
+
+    def add(self, records: Iterable[dict]) -> None:
+        """加入已分配 id 的记录；同一 id 只加入一次"""
+        lines = []
+        for record in records:
+            record_id = str(record.get("id") or "")
+            if not record_id or record_id in self.signatures:
+                continue
+            sig = self.signature(record_text(record))
+            if sig is None:
+                continue
+            keys = self._insert(record_id, sig)
+            if self.path:
+                lines.append(self._line(record_id, sig, keys))
+        if lines:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    def append_unloaded(self, records: Iterable[dict]) -> bool:
+        """
+        不加载已有索引，只计算新记录的签名并追加到索引文件（调用方保证 id 是新的）。
+        文件缺失或头部不匹配时不写入、返回 False，下次 load() 失败时会从语料重建
+        """
+        if not self.path or not self.path.exists():
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            if f.readline() != self._header():
+                return False
+        lines = []
+        for record in records:
+            record_id = str(record.get("id") or "")
+            sig = self.signature(record_text(record)) if record_id else None
+            if sig is not None:
+                lines.append(self._line(record_id, sig, self.band_keys(sig)))
+        if lines:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        return True
+
+    # ---------- 查询 ----------
+
+    def query_signature(self, sig: tuple[int, ...], threshold: float | None = None) -> Optional[str]:
+        threshold = self.threshold if threshold is None else threshold
+        best_id, best_sim = None, threshold
+        seen = set()
+        for key in self.band_keys(sig):
+            for candidate in self.buckets.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                sim = self.similarity(sig, self.signatures[candidate])
+                if sim >= best_sim:
+                    best_id, best_sim = candidate, sim
+        return best_id
+
+    def query(self, record, threshold: float | None = None) -> Optional[str]:
+        """返回与 record 近似重复（估计相似度 ≥ threshold）的已收录记录 id"""
+        sig = self.signature(record_text(record))
+        return self.query_signature(sig, threshold) if sig else None
+
+    def filter_new(self, records: list, threshold: float | None = None) -> list:
+        """过滤掉与索引或本批次前面条目近似重复的记录（不写入索引）"""
+        batch = NearDupIndex(threshold=self.threshold, num_perm=self.num_perm)
+        unique = []
+        for record in records:
+            sig = self.signature(record_text(record))
+            if sig is not None:
+                if self.query_signature(sig, threshold) or batch.query_signature(sig, threshold):
+                    continue
+                batch._insert(f"_batch{len(unique)}", sig)
+            unique.append(record)
+        return unique
+
+    def __len__(self) -> int:
+        return len(self.signatures)
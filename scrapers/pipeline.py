@@ -0,0 +1,277 @@
+"""
+PromptVault Pipeline — 从 adapter 到 prompts store 的流式采集管线
+各 adapter 的 iter_fetch() 逐条产出，经过 审查 → 图片判定 → 去重 → 打标 → 入库
+五个阶段，阶段之间用有界队列连接，每个阶段一个线程：
+
+    source(adapter) ─┐
+    source(adapter) ─┼─▶ filter ─▶ verdict ─▶ dedup ─▶ tag ─▶ store
+    source(adapter) ─┘
+
+- 不再写中间 JSON 文件、也不把整批结果读回内存；内存占用只与队列长度和本次新增条数有关
+- store 阶段每攒够 batch_size 条（或 flush_interval 秒）就 append 一次，
+  第一批条目在采集结束前就已落盘
+- 每个数据源入库 limit 条后通知其 source 线程停止翻页
+- filter 阶段提交图片检测后立即处理下一条，verdict 阶段再取结果，
+  队列中的条目图片并行下载
+- 条目的 checkpoint（增量水位线）只在入库成功或被确定丢弃（审查 / 去重）后调用；
+  超出 limit、deadline 后未处理或写入失败的条目不推进水位线，下次运行重新抓取
+
+使用方式:
+    pipeline = Pipeline(store, content_filter=ContentFilter())
+    stats = pipeline.run([(adapter, 30) for adapter in adapters], deadline=90)
+"""
+
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Optional
+
+from base_adapter import BaseAdapter
+from content_filter import ContentFilter
+from filter_log import FilterLogWriter
+from fingerprint import fingerprint, record_text
+from near_dup import NearDupIndex
+from prompt_store import PromptStore
+from tagging import infer, stamp
+
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_FLUSH_INTERVAL = 2.0
+
+_END = object()  # 流结束标记
+
+
+class Pipeline:
+    """多数据源共享的流式审查 / 去重 / 打标 / 入库管线"""
+
+    def __init__(
+        self,
+        store: PromptStore,
+        content_filter: Optional[ContentFilter] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        concurrency: int = 4,
+    ):
+        self.store = store
+        self.content_filter = content_filter
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.concurrency = concurrency
+        # dedup 阶段查询索引、store 阶段写入索引，两者互斥
+        self._store_lock = threading.Lock()
+        self._limits: dict[str, int] = {}
+        self._stop: dict[str, threading.Event] = {}
+        self.stats: dict[str, Counter] = {}
+        self.errors: dict[str, Exception] = {}
+        self._checkpoints: dict[int, Callable[[], None]] = {}  # id(record) → PromptItem.checkpoint
+
+    # ---------- 阶段 ----------
+
+    def _source(self, adapter: BaseAdapter, out: queue.Queue, slots: threading.Semaphore) -> None:
+        name = adapter.name
+        with slots:
+            try:
+                for item in adapter.iter_fetch(limit=self._limits[name]):
+                    if self._stop[name].is_set():
+                        break
+                    item.source_name = name
+                    self.stats[name]["fetched"] += 1
+                    record = item.to_dict()
+                    if item.checkpoint is not None:
+                        self._checkpoints[id(record)] = item.checkpoint
+                    out.put((name, record))
+            except Exception as e:
+                self.errors[name] = e
+
+    def _stage(self, name: str, inbox: queue.Queue, outbox: Optional[queue.Queue], handle) -> None:
+        """
+        通用阶段循环：handle(source, record) 返回要传给下游的 (source, record) 或 None。
+        出错后记录异常并继续清空上游队列，避免上游阻塞在满队列上。
+        """
+        failed = False
+        while True:
+            msg = inbox.get()
+            if msg is _END:
+                break
+            if failed:
+                continue
+            try:
+                result = handle(*msg)
+            except Exception as e:
+                self.errors[f"stage:{name}"] = e
+                failed = True
+                continue
+            if result is not None and outbox is not None:
+                outbox.put(result)
+        if outbox is not None:
+            outbox.put(_END)
+
+    def _settle(self, record: dict) -> None:
+        """条目已入库或被确定丢弃：推进对应数据源的水位线"""
+        checkpoint = self._checkpoints.pop(id(record), None)
+        if checkpoint is not None:
+            checkpoint()
+
+    def _filter(self, source: str, record: dict):
+        if self.content_filter is None:
+            return source, record, None, []
+        result = self.content_filter.check_item(record)
+        checker = self.content_filter.image_checker
+        jobs = checker.submit(record.get("images", [])) if checker is not None and not result.blocked else []
+        return source, record, result, jobs
+
+    def _verdict(self, source: str, record: dict, result, jobs: list):
+        if result is None:
+            return source, record
+        if jobs:
+            self.content_filter.check_image_content(jobs, result)
+        verdict = self.content_filter.tally(result, self._log)
+        if verdict != "safe":
+            self.stats[source][verdict] += 1
+            if verdict == "blocked":
+                print(f"  ⛔ [{source}] Blocked: {record.get('prompt', '')[:60]}...")
+            self._settle(record)
+            return None
+        return source, record
+
+    def _dedup(self, source: str, record: dict):
+        fp = fingerprint(record_text(record))
+        if fp in self._run_fingerprints:
+            self.stats[source]["duplicates"] += 1
+            self._settle(record)
+            return None
+        with self._store_lock:
+            known = self.store.dedup.contains(record)
+            near = None if known else self.store.near_dup.query(record)
+        if known:
+            self.stats[source]["duplicates"] += 1
+            self._settle(record)
+            return None
+        # 本次已接受但可能还没入库的条目也要参与近似去重
+        if near is not None or self._run_near_dup.query(record) is not None:
+            self.stats[source]["near_dups"] += 1
+            self._settle(record)
+            return None
+        self._run_fingerprints.add(fp)
+        self._run_near_dup.add([{"id": f"_run{len(self._run_fingerprints)}", "prompt": record_text(record)}])
+        return source, record
+
+    def _tag(self, source: str, record: dict):
+        if not record.get("tagging"):
+            text = record_text(record)
+            tags, style, _ = infer(text)
+            record["tags"] = record.get("tags") or tags
+            record["style"] = record.get("style") or style
+            record["tagging"] = stamp(text)
+        return source, record
+
+    def _store(self, inbox: queue.Queue) -> None:
+        batch: list[dict] = []
+        last_flush = time.monotonic()
+        date_str = datetime.now().strftime("%Y%m%d")
+        seq = self.store.max_seq
+        failed = False
+
+        def flush() -> None:
+            nonlocal batch, last_flush, failed
+            if batch and not failed:
+                try:
+                    with self._store_lock:
+                        self.store.append(batch)
+                    print(f"  Stored {len(batch)} prompts ({self.store.count} total)")
+                    for record in batch:
+                        self._settle(record)
+                except Exception as e:
+                    self.errors["stage:store"] = e
+                    failed = True
+            batch, last_flush = [], time.monotonic()
+
+        while True:
+            try:
+                msg = inbox.get(timeout=self.flush_interval)
+            except queue.Empty:
+                flush()
+                continue
+            if msg is _END:
+                break
+            source, record = msg
+            if self.stats[source]["added"] >= self._limits[source]:
+                # 不入库也不推进水位线，下次运行重新抓取
+                self.stats[source]["over_limit"] += 1
+                continue
+            seq += 1
+            record["id"] = f"{date_str}_{source[:3]}_{seq:03d}"
+            batch.append(record)
+            self.stats[source]["added"] += 1
+            if self.stats[source]["added"] >= self._limits[source]:
+                self._stop[source].set()
+            if len(batch) >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval:
+                flush()
+        flush()
+
+    # ---------- 运行 ----------
+
+    def run(self, sources: list[tuple[BaseAdapter, int]], deadline: Optional[float] = None) -> dict[str, Counter]:
+        """
+        运行管线直到所有数据源结束（或 deadline 秒后放弃未完成的数据源），返回各数据源的统计：
+        fetched / blocked / review / duplicates / near_dups / added / over_limit
+        """
+        # 索引在启动线程前加载，避免多个阶段同时触发懒加载
+        _ = self.store.dedup, self.store.near_dup
+        self._run_fingerprints: set = set()
+        self._run_near_dup = NearDupIndex(threshold=self.store.near_dup.threshold,
+                                          num_perm=self.store.near_dup.num_perm)
+        self._log = FilterLogWriter(self.content_filter.log_dir) if self.content_filter else None
+
+        for adapter, limit in sources:
+            self._limits[adapter.name] = limit
+            self._stop[adapter.name] = threading.Event()
+            self.stats[adapter.name] = Counter()
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(5)]
+        handlers = [("filter", self._filter), ("verdict", self._verdict),
+                    ("dedup", self._dedup), ("tag", self._tag)]
+        stages = [
+            threading.Thread(target=self._stage, args=(name, queues[i], queues[i + 1], handle),
+                             name=f"pipeline-{name}", daemon=True)
+            for i, (name, handle) in enumerate(handlers)
+        ]
+        stages.append(threading.Thread(target=self._store, args=(queues[4],), name="pipeline-store", daemon=True))
+        for t in stages:
+            t.start()
+
+        slots = threading.Semaphore(max(1, self.concurrency))
+        feeders = [
+            threading.Thread(target=self._source, args=(adapter, queues[0], slots),
+                             name=f"source-{adapter.name}", daemon=True)
+            for adapter, _ in sources
+        ]
+        for t in feeders:
+            t.start()
+
+        end = time.monotonic() + deadline if deadline else None
+        for t, (adapter, _) in zip(feeders, sources):
+            t.join(max(0.0, end - time.monotonic()) if end is not None else None)
+            if t.is_alive():
+                print(f"[WARN] Deadline reached, abandoning: {adapter.name}")
+                self._stop[adapter.name].set()
+        queues[0].put(_END)
+        for t in stages:
+            t.join()
+
+        if self._log is not None:
+            self._log.close(self.content_filter.stats)
+        return self.stats
+
+    def summary(self, source: str) -> str:
+        s = self.stats[source]
+        handled = s["added"] + s["duplicates"] + s["near_dups"] + s["blocked"] + s["review"]
+        summary = (f"+{s['added']} new, {s['fetched']} fetched, {s['duplicates']} duplicates, "
+                   f"{s['near_dups']} near-duplicates, {s['blocked']} blocked, {s['review']} flagged")
+        if s["fetched"] > handled:
+            summary += f", {s['fetched'] - handled} not stored (left for next run)"
+        return summary
@@ -1,16 +1,24 @@
 #!/usr/bin/env python3
 """
 Playwriter-based scraper for Civitai and PromptHero.
-Uses Arc browser via Playwriter extension to scrape new prompts.
+Browser scrapes run on a long-lived headless Chromium worker (browser_client.py).
 """
 
 import json
-import hashlib
 import time
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
+from browser_client import (
+    BLOCK_HOSTS, BLOCK_TYPES, PROMPT_KEYS, BrowserError, capture_job, default_worker, scrape_job,
+)
+from fingerprint import fingerprint
+from http_client import default_client
+from prompt_store import PromptStore
+from tagging import infer, stamp
+
 # Paths
 REPO_ROOT = Path(__file__).parent.parent
 DATA_FILE = REPO_ROOT / "data" / "prompts.json"
@@ -20,20 +28,6 @@ LOG_FILE = REPO_ROOT / "scrapers" / "output" / "scrape_log.json"
 LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
 
 
-def content_hash(prompt_text):
-    """Generate dedup hash from prompt text"""
-    normalized = " ".join(prompt_text.lower().split())
-    return hashlib.md5(normalized.encode()).hexdigest()[:12]
-
-
-def load_existing():
-    """Load existing prompts.json"""
-    if not DATA_FILE.exists():
-        return []
-    with open(DATA_FILE) as f:
-        return json.load(f)
-
-
 def is_nsfw(prompt):
     """Basic NSFW filter"""
     nsfw_terms = ["nsfw", "nude", "naked", "topless", "erotic", "sexy lingerie",
@@ -42,80 +36,142 @@ def is_nsfw(prompt):
     return any(term in prompt_lower for term in nsfw_terms)
 
 
-def playwriter_execute(script, timeout=10):
-    """Execute Playwriter script via MCP"""
+CIVITAI_EXTRACT = """article => {
+  const img = article.querySelector('img');
+  const promptBtn = article.querySelector('[aria-label*="prompt"]');
+  return {
+    image: img?.src || '',
+    prompt: promptBtn?.textContent || '',
+    url: article.querySelector('a')?.href || ''
+  };
+}"""
+
+PROMPTHERO_EXTRACT = """card => {
+  const img = card.querySelector('img');
+  const prompt = card.querySelector('[data-testid="prompt-text"]');
+  const link = card.querySelector('a');
+  return {
+    image: img?.src || '',
+    prompt: prompt?.textContent || '',
+    url: link?.href || ''
+  };
+}"""
+
+
+# Browser-scraped feeds; scrape_browser() runs them in parallel, one tab each
+BROWSER_FEEDS = {
+    "civitai": dict(
+        url="https://civitai.com/images?sort=Most+Reactions&period=Week",
+        selector="article", extract=CIVITAI_EXTRACT,
+        wait_until="networkidle", settle=2, scrolls=3, scroll_delay=1,
+    ),
+    "prompthero": dict(
+        url="https://prompthero.com/prompts?sort=popular&time=week",
+        selector='[data-testid="prompt-card"]', extract=PROMPTHERO_EXTRACT,
+        wait_until="networkidle", settle=3, scrolls=2, scroll_delay=1.5,
+    ),
+}
+
+
+# Capture mode: the same feeds, parsed from the JSON responses the pages fetch themselves
+CAPTURE_FEEDS = {
+    "civitai": dict(
+        url=BROWSER_FEEDS["civitai"]["url"], match=r"civitai\.com/api/",
+        block={"types": [*BLOCK_TYPES, "image"], "hosts": list(BLOCK_HOSTS)},
+    ),
+    "prompthero": dict(
+        url=BROWSER_FEEDS["prompthero"]["url"], match=r"prompthero\.com/",
+        block={"types": [*BLOCK_TYPES, "image"], "hosts": list(BLOCK_HOSTS)},
+    ),
+}
+
+# Page links for captured objects, which usually only carry an id
+CAPTURE_LINKS = {
+    "civitai": "https://civitai.com/images/{id}",
+    "prompthero": "https://prompthero.com/prompt/{id}",
+}
+
+IMAGE_KEYS = ("url", "image", "image_url", "imageUrl", "thumbnail_url", "thumbnail")
+
+
+def captured_item(feed, obj):
+    """Map a captured API object onto the raw item shape process_items() expects"""
+    meta = obj.get("meta") if isinstance(obj.get("meta"), dict) else {}
+    prompt = ""
+    for key in PROMPT_KEYS:
+        value = obj.get(key) or meta.get(key)
+        if isinstance(value, str) and value.strip():
+            prompt = value
+            break
+    image = ""
+    for key in IMAGE_KEYS:
+        value = obj.get(key)
+        if isinstance(value, str) and value.startswith("http"):
+            image = value
+            break
+    user = obj.get("user") if isinstance(obj.get("user"), dict) else {}
+    return {
+        "prompt": prompt,
+        "image": image,
+        "url": CAPTURE_LINKS[feed].format(id=obj["id"]) if obj.get("id") is not None else "",
+        "author": obj.get("username") or user.get("username") or "",
+        "meta": meta,
+    }
+
+
+def run_browser_jobs(names, jobs):
+    """Run browser jobs in parallel; failed jobs yield []. Returns None if the worker is unavailable"""
     try:
-        result = subprocess.run(
-            ["npx", "-y", "@playwright/test", "--headed"],
-            input=script,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            cwd=str(REPO_ROOT)
-        )
-        return result.stdout
-    except Exception as e:
-        print(f"  Playwriter error: {e}")
-        return ""
+        results = default_worker().scrape_all(jobs)
+    except BrowserError as e:
+        print(f"  Browser error: {e}")
+        return None
+
+    items = []
+    for name, result in zip(names, results):
+        if isinstance(result, BrowserError):
+            print(f"  {name} browser error: {result}")
+            result = []
+        items.append(result)
+    return items
+
+
+def scrape_browser(limits, mode="capture"):
+    """
+    Scrape several feeds at once on the shared browser worker: {feed: limit} -> {feed: items}.
+    Capture mode reads the feeds' own JSON responses; feeds that yield nothing are
+    retried with DOM scraping ("dom" mode skips capture entirely).
+    """
+    names = list(limits)
+    scraped = {name: [] for name in names}
+    print(f"\n[Browser] Scraping {', '.join(names)} ({mode})...")
+
+    if mode == "capture":
+        results = run_browser_jobs(names, [capture_job(limit=limits[name], **CAPTURE_FEEDS[name]) for name in names])
+        if results is None:
+            return scraped
+        for name, objs in zip(names, results):
+            scraped[name] = [item for item in (captured_item(name, obj) for obj in objs) if item["prompt"]]
+        names = [name for name in names if not scraped[name]]
+        if not names:
+            return scraped
+        print(f"  Nothing captured from {', '.join(names)}, falling back to DOM scraping")
+
+    results = run_browser_jobs(names, [scrape_job(limit=limits[name], **BROWSER_FEEDS[name]) for name in names])
+    for name, items in zip(names, results or []):
+        scraped[name] = items
+    return scraped
 
 
 def scrape_civitai_browser(limit=30):
     """Scrape Civitai via browser automation"""
-    print("\n[Civitai Browser] Starting scrape...")
-    
-    script = f"""
-    const {{ chromium }} = require('playwright');
-    (async () => {{
-      const browser = await chromium.connectOverCDP('http://localhost:9222');
-      const contexts = browser.contexts();
-      const page = contexts[0].pages()[0] || await contexts[0].newPage();
-      
-      await page.goto('https://civitai.com/images?sort=Most+Reactions&period=Week', {{waitUntil: 'networkidle'}});
-      await page.waitForTimeout(2000);
-      
-      // Scroll to load more
-      for (let i = 0; i < 3; i++) {{
-        await page.evaluate(() => window.scrollBy(0, 1000));
-        await page.waitForTimeout(1000);
-      }}
-      
-      // Extract prompts
-      const items = await page.$$eval('article', articles => {{
-        return articles.slice(0, {limit}).map(article => {{
-          const img = article.querySelector('img');
-          const promptBtn = article.querySelector('[aria-label*="prompt"]');
-          return {{
-            image: img?.src || '',
-            prompt: promptBtn?.textContent || '',
-            url: article.querySelector('a')?.href || ''
-          }};
-        }});
-      }});
-      
-      console.log(JSON.stringify(items));
-      await browser.close();
-    }})();
-    """
-    
-    output = playwriter_execute(script, timeout=30)
-    
-    try:
-        # Parse JSON from output
-        lines = output.strip().split('\n')
-        for line in lines:
-            if line.startswith('['):
-                return json.loads(line)
-    except:
-        pass
-    
-    return []
+    return scrape_browser({"civitai": limit})["civitai"]
 
 
 def scrape_civitai_api(limit=50):
     """Scrape Civitai via API (fallback)"""
     print("\n[Civitai API] Starting scrape...")
     
-    from urllib.request import urlopen, Request
     from urllib.parse import urlencode
     
     params = {
@@ -125,11 +181,9 @@ def scrape_civitai_api(limit=50):
         "nsfw": "None",
     }
     url = f"https://civitai.com/api/v1/images?{urlencode(params)}"
-    req = Request(url, headers={"User-Agent": "PromptVault/1.0"})
     
     try:
-        with urlopen(req, timeout=30) as resp:
-            data = json.loads(resp.read())
+        data = default_client().get_json(url, timeout=30)
         
         items = data.get("items", [])
         print(f"  Raw API response: {len(items)} items")
@@ -165,115 +219,7 @@ def scrape_civitai_api(limit=50):
 
 def scrape_prompthero_browser(limit=20):
     """Scrape PromptHero via browser (SPA requires JS execution)"""
-    print("\n[PromptHero Browser] Starting scrape...")
-    
-    script = f"""
-    const {{ chromium }} = require('playwright');
-    (async () => {{
-      const browser = await chromium.connectOverCDP('http://localhost:9222');
-      const contexts = browser.contexts();
-      const page = contexts[0].pages()[0] || await contexts[0].newPage();
-      
-      await page.goto('https://prompthero.com/prompts?sort=popular&time=week', {{waitUntil: 'networkidle'}});
-      await page.waitForTimeout(3000);
-      
-      // Scroll to load more
-      for (let i = 0; i < 2; i++) {{
-        await page.evaluate(() => window.scrollBy(0, 1000));
-        await page.waitForTimeout(1500);
-      }}
-      
-      // Extract prompts
-      const items = await page.$$eval('[data-testid="prompt-card"]', cards => {{
-        return cards.slice(0, {limit}).map(card => {{
-          const img = card.querySelector('img');
-          const prompt = card.querySelector('[data-testid="prompt-text"]');
-          const link = card.querySelector('a');
-          return {{
-            image: img?.src || '',
-            prompt: prompt?.textContent || '',
-            url: link?.href || ''
-          }};
-        }});
-      }});
-      
-      console.log(JSON.stringify(items));
-      await browser.close();
-    }})();
-    """
-    
-    output = playwriter_execute(script, timeout=30)
-    
-    try:
-        lines = output.strip().split('\n')
-        for line in lines:
-            if line.startswith('['):
-                return json.loads(line)
-    except:
-        pass
-    
-    return []
-
-
-def infer_tags(prompt):
-    """Infer tags from prompt text"""
-    prompt_lower = prompt.lower()
-    tag_keywords = {
-        "portrait": ["portrait", "face", "headshot", "woman", "man", "girl", "boy"],
-        "landscape": ["landscape", "scenery", "mountain", "ocean", "forest", "nature"],
-        "anime": ["anime", "manga", "waifu", "chibi"],
-        "photorealistic": ["photorealistic", "photo", "realistic", "raw photo", "dslr"],
-        "fantasy": ["fantasy", "dragon", "magic", "wizard", "elf", "sword"],
-        "sci-fi": ["sci-fi", "cyberpunk", "futuristic", "robot", "mech", "space"],
-        "architecture": ["architecture", "building", "interior", "room", "house"],
-        "character": ["character", "oc", "costume", "armor"],
-        "cinematic": ["cinematic", "film", "movie", "dramatic lighting"],
-    }
-    tags = []
-    for tag, keywords in tag_keywords.items():
-        if any(kw in prompt_lower for kw in keywords):
-            tags.append(tag)
-    return tags or ["general"]
-
-
-def infer_style(prompt):
-    """Infer style from prompt text"""
-    prompt_lower = prompt.lower()
-    styles = [
-        ("anime", ["anime", "manga", "waifu"]),
-        ("photorealistic", ["photorealistic", "raw photo", "dslr", "realistic"]),
-        ("digital-art", ["digital art", "digital painting", "illustration"]),
-        ("3d-render", ["3d render", "blender", "octane", "unreal engine"]),
-        ("cinematic", ["cinematic", "film still", "movie"]),
-        ("concept-art", ["concept art", "environment design"]),
-    ]
-    for style, keywords in styles:
-        if any(kw in prompt_lower for kw in keywords):
-            return style
-    return "mixed"
-
-
-def infer_tool(prompt, meta=None):
-    """Infer tool from prompt text and metadata"""
-    # Check metadata first (more reliable)
-    if meta:
-        model = (meta.get("Model") or "").lower()
-        if "flux" in model:
-            return "Flux"
-        if "sdxl" in model:
-            return "SDXL"
-        if "midjourney" in model:
-            return "Midjourney"
-    
-    # Fallback to prompt text
-    prompt_lower = prompt.lower()
-    if "midjourney" in prompt_lower or "--ar" in prompt_lower:
-        return "Midjourney"
-    if "flux" in prompt_lower:
-        return "Flux"
-    if "sdxl" in prompt_lower:
-        return "SDXL"
-    return "Stable Diffusion"
+    return scrape_browser({"prompthero": limit})["prompthero"]
 
 
 def process_items(raw_items, source_name):
@@ -291,46 +237,48 @@ def process_items(raw_items, source_name):
         if is_nsfw(prompt_text):
             continue
         
+        model = (item.get("meta") or {}).get("Model") or ""
+        tags, style, tool = infer(prompt_text, model=model)
         processed.append({
             "prompt": prompt_text,
             "images": [item.get("image", "")] if item.get("image") else [],
-            "tags": infer_tags(prompt_text),
-            "style": infer_style(prompt_text),
+            "tags": tags,
+            "style": style,
             "source_url": item.get("url", ""),
             "author": item.get("author", ""),
-            "tool": infer_tool(prompt_text, item.get("meta")),
+            "tool": tool,
             "created_at": datetime.now().strftime("%Y-%m-%d"),
             "collected_at": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
             "source_name": source_name,
+            "tagging": stamp(prompt_text),
         })
     
     return processed
 
 
-def deduplicate(existing, new_items):
-    """Deduplicate new items against existing"""
-    existing_hashes = {content_hash(p["prompt"]) for p in existing}
-    existing_images = {img for p in existing for img in p.get("images", [])}
+def deduplicate(index, new_items):
+    """Deduplicate new items against the store's dedup index"""
+    batch_hashes = set()
     
     unique = []
     for item in new_items:
-        h = content_hash(item["prompt"])
-        if h in existing_hashes:
+        h = fingerprint(item["prompt"])
+        if h in batch_hashes or index.find_fingerprint(h) is not None:
             continue
         
         # Check image duplication
-        if item["images"] and item["images"][0] in existing_images:
+        if item["images"] and index.find_image(item["images"][0]) is not None:
             continue
         
-        existing_hashes.add(h)
+        batch_hashes.add(h)
         unique.append(item)
     
     return unique
 
 
-def assign_ids(items, existing):
+def assign_ids(items, store):
     """Assign unique IDs to new items"""
-    max_id = max((int(p["id"].split("_")[-1]) for p in existing if p.get("id")), default=0)
+    max_id = store.max_seq
     date_str = datetime.now().strftime("%Y%m%d")
     
     for i, item in enumerate(items, 1):
@@ -381,15 +329,18 @@ def main():
     print("=" * 60)
     
     # Load existing data
-    existing = load_existing()
-    print(f"\nExisting prompts: {len(existing)}")
+    store = PromptStore(DATA_FILE)
+    print(f"\nExisting prompts: {store.count}")
     
     # Scrape sources
     all_new = []
     stats = {}
     
-    # Try Civitai API first (more reliable)
-    civitai_items = scrape_civitai_api(limit=50)
+    # Browser feeds load in their own tabs while the Civitai API (more reliable) is fetched
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        browser_future = pool.submit(scrape_browser, {"prompthero": 20})
+        civitai_items = scrape_civitai_api(limit=50)
+        browser_items = browser_future.result()
     if civitai_items:
         processed = process_items(civitai_items, "civitai")
         all_new.extend(processed)
@@ -397,7 +348,7 @@ def main():
         print(f"  Civitai API: {len(processed)} items")
     
     # Try PromptHero browser scrape
-    prompthero_items = scrape_prompthero_browser(limit=20)
+    prompthero_items = browser_items["prompthero"]
     if prompthero_items:
         processed = process_items(prompthero_items, "prompthero")
         all_new.extend(processed)
@@ -405,7 +356,7 @@ def main():
         print(f"  PromptHero Browser: {len(processed)} items")
     
     # Deduplicate
-    unique_new = deduplicate(existing, all_new)
+    unique_new = deduplicate(store.dedup, all_new)
     print(f"\nAfter deduplication: {len(unique_new)} unique new prompts")
     
     if not unique_new:
@@ -413,19 +364,18 @@ def main():
         return
     
     # Assign IDs
-    unique_new = assign_ids(unique_new, existing)
+    unique_new = assign_ids(unique_new, store)
     
-    # Merge and save
-    merged = existing + unique_new
-    with open(DATA_FILE, "w") as f:
-        json.dump(merged, f, ensure_ascii=False, indent=2)
+    # Append and publish (git push needs the compacted prompts.json)
+    store.append(unique_new)
+    store.compact()
     
     print(f"\n✅ Saved {len(unique_new)} new prompts")
-    print(f"Total prompts: {len(merged)}")
+    print(f"Total prompts: {store.count}")
     
     # Save log
     stats["new_unique"] = len(unique_new)
-    stats["total"] = len(merged)
+    stats["total"] = store.count
     stats["sources"] = list(set(item["source_name"] for item in unique_new))
     save_log(stats)
     
@@ -0,0 +1,331 @@
+"""
+PromptVault Prompt Store — prompts.json 的追加式存储层
+采集脚本不再每次整体重写 data/prompts.json，而是把新记录追加到 JSONL segment log，
+在 compact() 时一次性合并生成前端读取的 prompts.json。
+
+目录结构:
+    data/prompts.json                # 发布文件（前端 / sw.js 读取）
+    data/prompts.segments/
+        manifest.json                # 记录数、最大序号、待合并 segment 列表、已合并到的 segment 序号
+        seg_000001.jsonl             # 追加日志，一行一条记录
+        dedup.idx                    # 去重索引（见 dedup_index.py）
+        near_dup.idx                 # MinHash/LSH 近似去重索引（见 near_dup.py）
+
+日志格式（一行一个操作）:
+    {"op": "add", "record": {...}}   # append(): 新记录，追加到末尾
+    {"op": "put", "record": {...}}   # update(): 按 id 原位覆盖已有记录
+    {"op": "del", "id": "..."}       # delete(): 墓碑，compact 时移除
+
+使用方式:
+    from prompt_store import PromptStore
+    store = PromptStore("data/prompts.json")
+    store.append(records)
+    store.maybe_compact()   # 待合并记录超过阈值时才重写 prompts.json
+    store.compact()         # 发布 / git push 前强制合并
+
+    if store.dedup.contains(record): ...   # 去重只读 sidecar 索引，不解析语料
+    store.near_dup.query(record)           # 近似重复查询
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Iterator
+
+from dedup_index import DedupIndex
+from near_dup import DEFAULT_THRESHOLD, NearDupIndex
+
+MANIFEST_VERSION = 1
+
+# 待合并记录数超过该值时 maybe_compact() 触发合并
+DEFAULT_COMPACT_THRESHOLD = 500
+
+# 单个 segment 文件超过该大小后切换到新文件
+DEFAULT_SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+
+
+def _id_seq(record_id: str) -> int:
+    """解析 ID 末尾的数字序号（20260301_civ_042 → 42），无法解析时返回 0"""
+    tail = str(record_id or "").rsplit("_", 1)[-1]
+    return int(tail) if tail.isdigit() else 0
+
+
+def _segment_number(name: str) -> int:
+    """seg_000042.jsonl → 42"""
+    return int(name[4:-6])
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    """先写临时文件再 rename，避免中途失败留下半个文件"""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+class PromptStore:
+    """prompts.json + 追加日志的组合存储"""
+
+    def __init__(
+        self,
+        prompts_file: str | Path = "data/prompts.json",
+        segment_dir: str | Path | None = None,
+        compact_threshold: int = DEFAULT_COMPACT_THRESHOLD,
+        segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+        near_dup_threshold: float = DEFAULT_THRESHOLD,
+    ):
+        self.prompts_file = Path(prompts_file)
+        self.segment_dir = (
+            Path(segment_dir) if segment_dir
+            else self.prompts_file.with_name(f"{self.prompts_file.stem}.segments")
+        )
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_file = self.segment_dir / "manifest.json"
+        self.compact_threshold = compact_threshold
+        self.segment_max_bytes = segment_max_bytes
+        self.near_dup_threshold = near_dup_threshold
+        self._manifest = self._load_manifest()
+        self._dedup: DedupIndex | None = None
+        self._near_dup: NearDupIndex | None = None
+
+    # ---------- manifest ----------
+
+    def _base_signature(self) -> list:
+        if not self.prompts_file.exists():
+            return [0, 0]
+        st = self.prompts_file.stat()
+        return [st.st_size, st.st_mtime_ns]
+
+    def _load_manifest(self) -> dict:
+        manifest = None
+        if self.manifest_file.exists():
+            try:
+                manifest = json.loads(self.manifest_file.read_text())
+            except json.JSONDecodeError:
+                manifest = None
+        if (
+            manifest
+            and manifest.get("version") == MANIFEST_VERSION
+            and manifest.get("base") == self._base_signature()
+        ):
+            if manifest.get("compacting"):
+                # 上次 compact 在重写 prompts.json 之前中断，segment 仍然有效
+                del manifest["compacting"]
+                self._manifest = manifest
+                self._save_manifest()
+            return manifest
+        # 首次使用或 prompts.json 被外部修改：扫描一次发布文件重建计数
+        return self._rebuild_manifest(manifest)
+
+    def _rebuild_manifest(self, old: dict | None) -> dict:
+        old = old or {}
+        # 已合并进 prompts.json 的 segment 不能再重放：包括上次 compact 完成后没删掉的，
+        # 以及 compact 重写 prompts.json 后、保存 manifest 前中断时的那一批
+        compacted = max(old.get("compacted_through", 0), old.get("compacting", 0))
+        segments = []
+        for path in sorted(self.segment_dir.glob("seg_*.jsonl")):
+            if _segment_number(path.name) <= compacted:
+                path.unlink(missing_ok=True)
+            else:
+                segments.append(path.name)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "base": self._base_signature(),
+            "count": 0,
+            "max_seq": 0,
+            "pending": 0,
+            "segments": segments,
+            "next_segment": max(old.get("next_segment", 1), compacted + 1),
+            "compacted_through": compacted,
+            # 每次重建递增，使 dedup 索引失效
+            "generation": old.get("generation", 0) + 1,
+        }
+        if segments:
+            last = _segment_number(segments[-1])
+            manifest["next_segment"] = max(manifest["next_segment"], last + 1)
+
+        self._manifest = manifest
+        records = self.load()
+        manifest["count"] = len(records)
+        manifest["max_seq"] = max((_id_seq(r.get("id")) for r in records), default=0)
+        manifest["pending"] = sum(1 for _ in self._iter_log())
+        self._save_manifest()
+        return manifest
+
+    def _save_manifest(self) -> None:
+        _write_atomic(self.manifest_file, json.dumps(self._manifest, ensure_ascii=False, indent=2))
+
+    @property
+    def count(self) -> int:
+        """当前记录总数（含未合并的 segment）"""
+        return self._manifest["count"]
+
+    @property
+    def max_seq(self) -> int:
+        """已有 ID 的最大数字序号，用于分配新 ID"""
+        return self._manifest["max_seq"]
+
+    @property
+    def pending(self) -> int:
+        """segment log 中尚未合并进 prompts.json 的条目数"""
+        return self._manifest["pending"]
+
+    @property
+    def dedup(self) -> DedupIndex:
+        """去重索引，首次访问时加载；索引缺失或过期则从语料重建"""
+        if self._dedup is None:
+            index = DedupIndex(self.segment_dir / "dedup.idx", self._manifest.get("generation", 0))
+            if not index.load():
+                index.rebuild(self.load())
+            self._dedup = index
+        return self._dedup
+
+    def _near_dup_file(self) -> NearDupIndex:
+        return NearDupIndex(
+            self.segment_dir / "near_dup.idx",
+            self._manifest.get("generation", 0),
+            threshold=self.near_dup_threshold,
+        )
+
+    @property
+    def near_dup(self) -> NearDupIndex:
+        """近似去重索引；阈值改变导致 band 参数变化时从语料重建"""
+        if self._near_dup is None:
+            index = self._near_dup_file()
+            if not index.load():
+                index.rebuild(self.load())
+            self._near_dup = index
+        return self._near_dup
+
+    # ---------- 写入 ----------
+
+    def _current_segment(self) -> Path:
+        segments = self._manifest["segments"]
+        if segments:
+            current = self.segment_dir / segments[-1]
+            if current.exists() and current.stat().st_size < self.segment_max_bytes:
+                return current
+        name = f"seg_{self._manifest['next_segment']:06d}.jsonl"
+        self._manifest["next_segment"] += 1
+        segments.append(name)
+        return self.segment_dir / name
+
+    def _write_log(self, ops: list[dict]) -> None:
+        if not ops:
+            return
+        segment = self._current_segment()
+        with open(segment, "a", encoding="utf-8") as f:
+            for op in ops:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._manifest["pending"] += len(ops)
+
+    def append(self, records: list[dict]) -> int:
+        """追加新记录（调用方负责去重和分配 ID），返回写入条数"""
+        self._write_log([{"op": "add", "record": r} for r in records])
+        self._manifest["count"] += len(records)
+        for r in records:
+            self._manifest["max_seq"] = max(self._manifest["max_seq"], _id_seq(r.get("id")))
+        self._save_manifest()
+        self.dedup.add(records)
+        if self._near_dup is not None:
+            self._near_dup.add(records)
+        else:
+            # 不为一次追加加载整个 MinHash 索引：只把新记录的签名追加到索引文件
+            self._near_dup_file().append_unloaded(records)
+        return len(records)
+
+    def update(self, records: list[dict]) -> int:
+        """按 id 覆盖已有记录"""
+        self._write_log([{"op": "put", "record": r} for r in records])
+        self._save_manifest()
+        self.dedup.add(records)
+        return len(records)
+
+    def delete(self, ids: list[str]) -> int:
+        """按 id 删除记录（写墓碑，compact 时生效），返回实际存在并被删除的条数"""
+        existing = {r.get("id") for r in self.load()}
+        ids = [i for i in dict.fromkeys(ids) if i in existing]
+        self._write_log([{"op": "del", "id": i} for i in ids])
+        self._manifest["count"] -= len(ids)
+        self._save_manifest()
+        return len(ids)
+
+    # ---------- 读取 ----------
+
+    def _iter_log(self) -> Iterator[dict]:
+        for name in self._manifest["segments"]:
+            segment = self.segment_dir / name
+            if not segment.exists():
+                continue
+            with open(segment, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+
+    def _load_base(self) -> list[dict]:
+        if not self.prompts_file.exists():
+            return []
+        return json.loads(self.prompts_file.read_text())
+
+    def load(self) -> list[dict]:
+        """读取完整语料（prompts.json + segment log，按 id 应用覆盖和删除）"""
+        records = self._load_base()
+        positions = None
+        for op in self._iter_log():
+            if op["op"] == "add":
+                if positions is not None:
+                    positions[op["record"].get("id")] = len(records)
+                records.append(op["record"])
+                continue
+            if positions is None:
+                positions = {r.get("id"): i for i, r in enumerate(records)}
+            record_id = op["record"].get("id") if op["op"] == "put" else op["id"]
+            pos = positions.get(record_id)
+            if pos is None:
+                continue
+            if op["op"] == "put":
+                records[pos] = op["record"]
+            else:
+                records[pos] = None
+                del positions[record_id]
+        return [r for r in records if r is not None]
+
+    # ---------- 合并 ----------
+
+    def compact(self) -> bool:
+        """
+        把 segment log 合并进 prompts.json，返回是否发生了重写。
+        重写前先在 manifest 记下要合并的最后一个 segment，任何一步中断后重建 manifest
+        都不会把已合并的 segment 再重放一遍
+        """
+        segments = self._manifest["segments"]
+        if not segments:
+            return False
+        records = self.load()
+        last = _segment_number(segments[-1])
+        self._manifest["compacting"] = last
+        self._save_manifest()
+
+        self.prompts_file.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self.prompts_file, json.dumps(records, ensure_ascii=False, indent=2))
+        del self._manifest["compacting"]
+        self._manifest.update({
+            "base": self._base_signature(),
+            "count": len(records),
+            "max_seq": max((_id_seq(r.get("id")) for r in records), default=0),
+            "pending": 0,
+            "segments": [],
+            "compacted_through": last,
+        })
+        self._save_manifest()
+        for name in segments:
+            (self.segment_dir / name).unlink(missing_ok=True)
+        return True
+
+    def maybe_compact(self) -> bool:
+        """待合并条目超过阈值时才合并"""
+        if self.pending >= self.compact_threshold:
+            return self.compact()
+        return False
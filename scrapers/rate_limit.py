@@ -0,0 +1,179 @@
+"""
+PromptVault Rate Limit — 按 host 的令牌桶限速 + 自适应退避
+所有 adapter / 脚本共用 HttpClient 上的同一个 RateLimiter：每个 host 一个令牌桶，
+请求前取令牌，桶空时等待；不再在调用方硬编码 time.sleep(1)。
+
+- 429 / 5xx：优先按 Retry-After 等待，否则指数退避 + full jitter；
+  等待期间同一 host 的所有请求一起暂停
+- 被限流后该 host 的速率减半（不低于上限的 1/16），之后每次成功请求逐步恢复到配置上限
+- 未配置的 host 不做速率限制，只在 429 / 5xx 时退避
+
+限速按 host 配置（HOST_LIMITS），adapter 可通过 rate_limits 类属性覆盖自己数据源的 host。
+
+使用方式（通过 HttpClient，无需直接调用）:
+    http = default_client()
+    http.limiter.configure("civitai.com", rate=2.0, burst=4)
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple, Optional
+
+
+class HostLimit(NamedTuple):
+    rate: float     # 每秒请求数上限
+    burst: int      # 空闲后允许的突发请求数
+
+
+# 各数据源 host 的默认限速
+HOST_LIMITS: dict[str, HostLimit] = {
+    "civitai.com": HostLimit(2.0, 4),
+    "www.midjourney.com": HostLimit(1.0, 2),
+    "midlibrary.io": HostLimit(0.5, 2),
+    "prompthero.com": HostLimit(0.5, 2),
+}
+
+# 触发退避的状态码
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+BASE_DELAY = 1.0        # 首次退避的基准等待（秒）
+MAX_DELAY = 60.0        # 指数退避上限
+MAX_RETRY_AFTER = 300.0  # Retry-After 超过此值时按此值等待
+MIN_RATE_FRACTION = 1 / 16
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After 可以是秒数或 HTTP 日期；无法解析时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    单个 host 的令牌桶。rate 为 None 时不限速，只响应 pause()。
+    令牌可以为负：并发请求按到达顺序排队，各自算出需要等待的时间。
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: int = 1):
+        self.ceiling = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.rate is not None and now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self) -> float:
+        """预订一个令牌，返回调用方需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate is None:
+                return max(0.0, self.paused_until - now)
+            self._refill(now)
+            self.tokens -= 1
+            ready_at = max(self.updated, now) + max(0.0, -self.tokens) / self.rate
+            return max(0.0, ready_at - now, self.paused_until - now)
+
+    def pause(self, delay: float) -> None:
+        """delay 秒内不再放行请求；暂停期间不补充令牌，恢复后只放行一个请求而不是一次性突发"""
+        with self._lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + delay)
+            if self.rate is not None:
+                self._refill(now)
+                self.tokens = 1.0
+                self.updated = max(self.updated, self.paused_until)
+
+    def slow_down(self) -> None:
+        with self._lock:
+            if self.rate is not None:
+                self.rate = max(self.ceiling * MIN_RATE_FRACTION, self.rate / 2)
+
+    def speed_up(self) -> None:
+        with self._lock:
+            if self.rate is not None and self.rate < self.ceiling:
+                self.rate = min(self.ceiling, self.rate + self.ceiling * MIN_RATE_FRACTION)
+
+
+class RateLimiter:
+    """按 host 管理令牌桶，并计算 429 / 5xx 后的退避时间"""
+
+    def __init__(
+        self,
+        limits: Optional[dict[str, HostLimit]] = None,
+        base_delay: float = BASE_DELAY,
+        max_delay: float = MAX_DELAY,
+    ):
+        self.limits = dict(HOST_LIMITS if limits is None else limits)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.stats = {"waits": 0, "waited_seconds": 0.0, "throttled": 0}
+
+    def configure(self, host: str, rate: Optional[float], burst: int = 1) -> None:
+        """设置 host 的限速；rate=None 表示不限速"""
+        host = host.lower()
+        with self._lock:
+            if rate is None:
+                self.limits.pop(host, None)
+            else:
+                self.limits[host] = HostLimit(rate, burst)
+            self._buckets.pop(host, None)
+
+    def bucket(self, host: str) -> TokenBucket:
+        host = host.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                limit = self.limits.get(host)
+                bucket = TokenBucket(limit.rate, limit.burst) if limit else TokenBucket()
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, host: str) -> float:
+        """阻塞到 host 允许发送下一个请求，返回实际等待的秒数"""
+        wait = self.bucket(host).reserve()
+        if wait > 0:
+            with self._lock:
+                self.stats["waits"] += 1
+                self.stats["waited_seconds"] += wait
+            time.sleep(wait)
+        return wait
+
+    def on_success(self, host: str) -> None:
+        self.bucket(host).speed_up()
+
+    def on_throttle(self, host: str, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        记录一次 429 / 5xx，暂停该 host 并降低速率，返回退避时间。
+        有 Retry-After 时按其等待，否则为 [0, base_delay * 2^attempt] 内的随机值（full jitter）。
+        """
+        if retry_after is not None:
+            delay = min(retry_after, MAX_RETRY_AFTER)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        bucket = self.bucket(host)
+        bucket.slow_down()
+        bucket.pause(delay)
+        with self._lock:
+            self.stats["throttled"] += 1
+        return delay
@@ -0,0 +1,186 @@
+"""
+PromptVault Source Health — 数据源健康状态 + 熔断器
+按 endpoint（"midjourney:recent-jobs"、"prompthero:prompts" 等）记录连续失败次数、
+最近一次成功 / 失败时间和错误信息，跨运行持久化。连续失败达到阈值后熔断：
+之后的运行直接跳过该 endpoint，冷却期过后才放行一次探测请求；
+探测成功恢复正常，失败则冷却期翻倍（上限 max_cooldown）。
+
+- adapter 的 known_broken 类属性（如 PromptHero 自 2026-03-02 起不可用）
+  在没有历史记录时直接视为熔断状态，只按最长冷却期探测
+- 状态文件: scrapers/output/source_health.json
+
+使用方式（通过 BaseAdapter，无需直接调用）:
+    health = SourceHealth()
+    adapter = get_adapter("midjourney", health=health)
+    adapter.run(limit=30)
+    health.save()
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_HEALTH_FILE = "scrapers/output/source_health.json"
+FAILURE_THRESHOLD = 3           # 连续失败几次后熔断
+BASE_COOLDOWN = 6 * 3600        # 首次熔断的冷却期（秒）
+MAX_COOLDOWN = 7 * 24 * 3600    # 冷却期上限
+
+
+class SourceUnavailable(Exception):
+    """endpoint 有响应但拿不到数据（页面结构变化、返回空壳等），计为一次失败"""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class EndpointHealth:
+    """单个 endpoint 的健康状态"""
+
+    def __init__(self, data: Optional[dict] = None):
+        data = data or {}
+        self.failures: int = data.get("failures", 0)              # 连续失败次数
+        self.total_failures: int = data.get("total_failures", 0)
+        self.last_success: Optional[str] = data.get("last_success")
+        self.last_failure: Optional[str] = data.get("last_failure")
+        self.last_error: str = data.get("last_error", "")
+        self.opened_at: Optional[str] = data.get("opened_at")     # 熔断时间，None 表示正常
+        self.cooldown: float = data.get("cooldown", 0)
+
+    def to_dict(self) -> dict:
+        return {
+            "failures": self.failures,
+            "total_failures": self.total_failures,
+            "last_success": self.last_success,
+            "last_failure": self.last_failure,
+            "last_error": self.last_error,
+            "opened_at": self.opened_at,
+            "cooldown": self.cooldown,
+        }
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def retry_at(self) -> Optional[datetime]:
+        opened = _parse(self.opened_at)
+        if opened is None:
+            return None
+        return datetime.fromtimestamp(opened.timestamp() + self.cooldown, timezone.utc)
+
+
+class SourceHealth:
+    """所有 endpoint 的健康状态与熔断判断"""
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_HEALTH_FILE,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        base_cooldown: float = BASE_COOLDOWN,
+        max_cooldown: float = MAX_COOLDOWN,
+        force: bool = False,
+    ):
+        self.path = Path(path)
+        self.force = force  # True 时忽略熔断状态（仍记录结果），用于手动验证数据源是否恢复
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._probing: set[str] = set()
+        self.endpoints: dict[str, EndpointHealth] = {}
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text())
+            except json.JSONDecodeError:
+                data = {}
+            self.endpoints = {key: EndpointHealth(value) for key, value in data.items()}
+
+    def get(self, key: str, known_broken: Optional[str] = None) -> EndpointHealth:
+        """返回 endpoint 状态；首次出现且 known_broken（日期）不为空时以熔断状态初始化"""
+        with self._lock:
+            entry = self.endpoints.get(key)
+            if entry is None:
+                entry = EndpointHealth()
+                if known_broken:
+                    entry.opened_at = known_broken
+                    entry.cooldown = self.max_cooldown
+                    entry.last_error = f"known broken since {known_broken}"
+                self.endpoints[key] = entry
+            return entry
+
+    def allow(self, key: str, known_broken: Optional[str] = None) -> bool:
+        """正常状态放行；熔断状态在冷却期结束后放行一次探测"""
+        entry = self.get(key, known_broken)
+        with self._lock:
+            if not entry.is_open:
+                return True
+            if self.force:
+                self._probing.add(key)
+                return True
+            if key in self._probing or _now() < entry.retry_at():
+                return False
+            self._probing.add(key)
+            return True
+
+    def record_success(self, key: str) -> None:
+        with self._lock:
+            entry = self.endpoints.setdefault(key, EndpointHealth())
+            entry.failures = 0
+            entry.last_success = _iso(_now())
+            entry.opened_at = None
+            entry.cooldown = 0
+            self._probing.discard(key)
+
+    def record_failure(self, key: str, error: object) -> None:
+        with self._lock:
+            entry = self.endpoints.setdefault(key, EndpointHealth())
+            now = _now()
+            entry.failures += 1
+            entry.total_failures += 1
+            entry.last_failure = _iso(now)
+            entry.last_error = str(error)[:200]
+            if key in self._probing:
+                # 探测失败：重新熔断，冷却期翻倍
+                entry.opened_at = _iso(now)
+                entry.cooldown = min(self.max_cooldown, max(self.base_cooldown, entry.cooldown * 2))
+                self._probing.discard(key)
+            elif not entry.is_open and entry.failures >= self.failure_threshold:
+                entry.opened_at = _iso(now)
+                entry.cooldown = self.base_cooldown
+
+    def describe(self, key: str) -> str:
+        """一行状态摘要（collect.py --list）"""
+        entry = self.endpoints.get(key)
+        if entry is None or not (entry.is_open or entry.failures or entry.last_success):
+            return "no history"
+        if entry.is_open:
+            return (f"circuit open since {entry.opened_at}, next probe {_iso(entry.retry_at())} "
+                    f"({entry.last_error})")
+        if entry.failures:
+            return f"{entry.failures} consecutive failures, last success {entry.last_success or 'never'}"
+        return f"ok, last success {entry.last_success}"
+
+    def save(self) -> None:
+        with self._lock:
+            payload = json.dumps({k: v.to_dict() for k, v in self.endpoints.items()}, indent=1)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(payload)
+        os.replace(tmp, self.path)
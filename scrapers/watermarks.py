@@ -0,0 +1,180 @@
+"""
+PromptVault Watermarks — 增量抓取水位线
+按 (数据源, 查询) 持久化上次抓取到的位置：最近见过的条目 ID、最大 ID、最新创建时间，
+以及上次因数量上限中途停下时的 cursor。再次抓取时一旦整页条目都已见过就停止翻页，
+每次运行的请求数随新内容增长，而不是随 feed 深度增长。
+
+- 整页已知：页内每个 ID 都在最近见过的 ID 集合中（按 ID 递增的 feed，如 Newest，
+  ID 不超过 last_id 也视为已知）
+- 顶部已知且上次留有 cursor 时，直接跳到 cursor 继续上次未抓完的深处，只跳一次
+- 只有被调用方完整消费的页面才记为已见；中途停下的页面下次会重新抓取。
+  observe=False 时 follow_pages 不记录，由调用方在条目真正入库（或确定丢弃）后
+  自行 mark.observe()，没处理完的条目下次仍会抓取
+
+文件: scrapers/output/watermarks.json
+
+使用方式:
+    marks = WatermarkStore()
+    mark = marks.get("civitai", "Most Reactions/Week")
+    for page in follow_pages(fetch_page, mark, max_pages=20):
+        ...
+    marks.save()
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+DEFAULT_WATERMARK_FILE = "scrapers/output/watermarks.json"
+MAX_SEEN_IDS = 5000  # 每个查询保留的最近 ID 数
+
+# fetch(cursor) -> (条目列表, 下一页 cursor)；出错时返回 None
+PageFetcher = Callable[[Optional[str]], Optional[tuple[list[dict], Optional[str]]]]
+
+
+class Watermark:
+    """单个 (source, query) 的水位线"""
+
+    def __init__(self, data: Optional[dict] = None, ordered_by_id: bool = False):
+        data = data or {}
+        self.last_id: Optional[int] = data.get("last_id")
+        self.last_seen: str = data.get("last_seen", "")
+        self.cursor: Optional[str] = data.get("cursor")
+        self.updated_at: str = data.get("updated_at", "")
+        self.seen: dict[str, None] = dict.fromkeys(data.get("seen", []))  # 有序集合，旧的在前
+        self.ordered_by_id = ordered_by_id
+        self._lock = threading.Lock()  # 采集线程 observe 时主线程可能在 save
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "last_id": self.last_id,
+                "last_seen": self.last_seen,
+                "cursor": self.cursor,
+                "updated_at": self.updated_at,
+                "seen": list(self.seen),
+            }
+
+    def is_known(self, item: dict) -> bool:
+        item_id = item.get("id")
+        if item_id is None:
+            return False
+        if str(item_id) in self.seen:
+            return True
+        return (self.ordered_by_id and self.last_id is not None
+                and isinstance(item_id, int) and item_id <= self.last_id)
+
+    def page_known(self, items: list[dict]) -> bool:
+        return bool(items) and all(self.is_known(item) for item in items)
+
+    def observe(self, items: list[dict]) -> None:
+        """记录一页已被完整处理的条目"""
+        with self._lock:
+            for item in items:
+                item_id = item.get("id")
+                if item_id is None:
+                    continue
+                key = str(item_id)
+                self.seen.pop(key, None)
+                self.seen[key] = None
+                if isinstance(item_id, int) and (self.last_id is None or item_id > self.last_id):
+                    self.last_id = item_id
+                created = item.get("createdAt") or ""
+                if created > self.last_seen:
+                    self.last_seen = created
+            while len(self.seen) > MAX_SEEN_IDS:
+                del self.seen[next(iter(self.seen))]
+            self.updated_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class WatermarkStore:
+    """所有数据源 / 查询的水位线，保存在一个 JSON 文件中"""
+
+    def __init__(self, path: str | Path = DEFAULT_WATERMARK_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._data: dict[str, dict[str, dict]] = {}
+        self._marks: dict[tuple[str, str], Watermark] = {}
+        if self.path.exists():
+            try:
+                self._data = json.loads(self.path.read_text())
+            except json.JSONDecodeError:
+                self._data = {}
+
+    def get(self, source: str, query: str, ordered_by_id: bool = False) -> Watermark:
+        with self._lock:
+            key = (source, query)
+            mark = self._marks.get(key)
+            if mark is None:
+                mark = Watermark(self._data.get(source, {}).get(query), ordered_by_id=ordered_by_id)
+                self._marks[key] = mark
+            return mark
+
+    def reset(self, source: Optional[str] = None) -> None:
+        """清除水位线（全部或某个数据源），下次从 feed 顶部完整抓取"""
+        with self._lock:
+            if source is None:
+                self._data, self._marks = {}, {}
+            else:
+                self._data.pop(source, None)
+                self._marks = {k: v for k, v in self._marks.items() if k[0] != source}
+
+    def save(self) -> None:
+        with self._lock:
+            for (source, query), mark in self._marks.items():
+                self._data.setdefault(source, {})[query] = mark.to_dict()
+            payload = json.dumps(self._data, ensure_ascii=False, indent=1)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(payload)
+        os.replace(tmp, self.path)
+
+
+def follow_pages(
+    fetch: PageFetcher,
+    mark: Optional[Watermark],
+    max_pages: int,
+    observe: bool = True,
+) -> Iterator[list[dict]]:
+    """
+    沿 cursor 逐页产出条目。mark 为 None 时逐页产出，由调用方去重（HTTP 缓存命中只省下载，
+    不代表页面已入库）；有水位线时遇到整页已知即停止（顶部已知且上次留有 cursor 时先跳过去一次）。
+    observe=True 时调用方取下一页即视为上一页已处理完；False 时由调用方逐条 observe。
+    """
+    resume = mark.cursor if mark is not None else None
+    cursor = None
+    for _ in range(max_pages):
+        page = fetch(cursor)
+        if page is None:
+            return
+        items, next_cursor = page
+        if not items:
+            if mark is not None:
+                mark.cursor = None
+            return
+
+        if mark is None:
+            yield items
+        elif mark.page_known(items):
+            if resume and resume != cursor:
+                cursor, resume = resume, None
+                continue
+            mark.cursor = None
+            return
+        else:
+            mark.cursor = cursor  # 调用方在这一页中途停下时，下次从这里继续
+            yield items
+            if observe:
+                mark.observe(items)
+
+        if not next_cursor:
+            if mark is not None:
+                mark.cursor = None
+            return
+        cursor = next_cursor
+
+    if mark is not None:
+        mark.cursor = cursor